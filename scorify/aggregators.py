@@ -5,6 +5,12 @@
 """
 Aggregators are functions that condense sets of numbers into single ones.
 They're used by measure directives.
+
+Most aggregators also have a matrix version, which aggregates every row of a
+(rows x items) float array at once. These take the array and a mask of the
+cells that couldn't be converted to float (see utils.to_float_matrix()), and
+give exactly the same results as calling the regular aggregator on each row --
+including NaN where the regular aggregator would raise ValueError.
 """
 
 from __future__ import absolute_import, division
@@ -13,6 +19,8 @@ import math
 import re
 import logging
 
+import numpy as np
+
 NaN = float("nan")
 
 expr_re = re.compile(
@@ -141,5 +149,109 @@ def ag_min(values):
     return min([float(v) for v in values])
 
 
+def fsum_or_nan(values):
+    try:
+        return math.fsum(values)
+    except ValueError:
+        return NaN
+
+
+def row_sums(values):
+    """
+    math.fsum() of each row. fsum() is exact, so when every value in a row is
+    an integer small enough that any order of adding gives an exact answer
+    (which is what survey data almost always looks like), we can use numpy's
+    sum; otherwise we fall back to fsum() for that row.
+    """
+    sums = values.sum(axis=1)
+    limit = 2.0**52 / max(values.shape[1], 1)
+    with np.errstate(invalid="ignore"):
+        exact = np.all((values == np.floor(values)) & (np.abs(values) < limit), axis=1)
+    inexact = np.flatnonzero(~exact)
+    if len(inexact) > 0:
+        sums[inexact] = [fsum_or_nan(row) for row in values[inexact].tolist()]
+    return sums
+
+
+def matrix_sum(values, invalid):
+    sums = row_sums(values)
+    sums[invalid.any(axis=1)] = NaN
+    return sums
+
+
+def matrix_mean(values, invalid):
+    return matrix_sum(values, invalid) / values.shape[1]
+
+
+def impute_mean_matrix(values, invalid):
+    """
+    Each row of values, with anything non-finite replaced by the mean of that
+    row's finite values. Rows with no finite values are all NaN.
+    """
+    finite = np.isfinite(values)
+    counts = finite.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = row_sums(np.where(finite, values, 0.0)) / counts
+    return np.where(finite, values, means[:, np.newaxis])
+
+
+def matrix_sum_imputed(values, invalid):
+    return row_sums(impute_mean_matrix(values, invalid))
+
+
+def matrix_mean_imputed(values, invalid):
+    return matrix_sum_imputed(values, invalid) / values.shape[1]
+
+
+def matrix_imputed_fraction(values, invalid):
+    imputed_counts = values.shape[1] - np.isfinite(values).sum(axis=1)
+    return imputed_counts / values.shape[1]
+
+
+def matrix_reduce(values, invalid, better):
+    # Works through the items left to right just like min() and max(), so NaNs
+    # come out the same way they do there
+    result = values[:, 0].copy()
+    for i in range(1, values.shape[1]):
+        item = values[:, i]
+        with np.errstate(invalid="ignore"):
+            result = np.where(better(item, result), item, result)
+    result[invalid.any(axis=1)] = NaN
+    return result
+
+
+def matrix_max(values, invalid):
+    return matrix_reduce(values, invalid, np.greater)
+
+
+def matrix_min(values, invalid):
+    return matrix_reduce(values, invalid, np.less)
+
+
+matrix_fx_map = {
+    ag_sum: matrix_sum,
+    ag_mean: matrix_mean,
+    ag_sum_imputed: matrix_sum_imputed,
+    ag_mean_imputed: matrix_mean_imputed,
+    ag_imputed_fraction: matrix_imputed_fraction,
+    ag_max: matrix_max,
+    ag_min: matrix_min,
+}
+
+
+def is_numeric(fx):
+    """
+    Whether aggregator fx gives numbers; only join() gives text.
+    """
+    return fx is not ag_join
+
+
+def matrix_version(fx):
+    """
+    The matrix version of aggregator fx, or None if it doesn't have one.
+    """
+    return matrix_fx_map.get(fx)
+
+
 class AggregatorError(ValueError):
     pass
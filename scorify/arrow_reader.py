@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+"""
+Reads Parquet or Feather (Arrow IPC) files as if they were CSV files, so they
+can go straight into a Datafile.
+
+The first line is the file's column names, and every line after that is a
+row, with every value converted to a string (nulls become blanks) -- just
+like you'd see if you exported the file to CSV. So a layout of "header" then
+"data" is what you'll want; any skip or keep lines after the header apply to
+the first rows of data, as they would in the exported CSV.
+
+Pass columns to read only those columns; with Parquet, the others are never
+even loaded. Rows are converted a batch at a time, so big files can be
+streamed.
+"""
+
+from __future__ import absolute_import
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from scorify.arrow_writer import ArrowFormatError
+
+EXTENSIONS = (".parquet", ".feather", ".arrow")
+
+# How many rows to convert to strings at once
+BATCH_ROWS = 10000
+
+
+def is_arrow_file(filename):
+    return str(filename).lower().endswith(EXTENSIONS)
+
+
+class ArrowReader(object):
+    """
+    Like csv.reader, this is iterable, returns a list per line, and keeps
+    track of line_num.
+    """
+
+    def __init__(self, filename, columns=None, batch_rows=BATCH_ROWS):
+        if pyarrow is None:
+            raise ArrowFormatError(
+                f"Reading {filename} needs pyarrow; try pip install pyarrow"
+            )
+        self.filename = str(filename)
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.line_num = 0
+
+    def __iter__(self):
+        if self.filename.lower().endswith(".parquet"):
+            names, batches = self.parquet_batches()
+        else:
+            names, batches = self.ipc_batches()
+        self.line_num += 1
+        yield list(names)
+        for batch in batches:
+            for line in self.batch_lines(batch):
+                self.line_num += 1
+                yield line
+
+    def selected(self, names):
+        if self.columns is None:
+            return list(names)
+        return [name for name in names if name in self.columns]
+
+    def parquet_batches(self):
+        pf = pyarrow.parquet.ParquetFile(self.filename)
+        names = self.selected(pf.schema_arrow.names)
+        return names, pf.iter_batches(batch_size=self.batch_rows, columns=names)
+
+    def ipc_batches(self):
+        # Memory-mapped, so only the columns we look at are actually read
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(self.filename))
+        names = self.selected(reader.schema.names)
+
+        def batches():
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i).select(names)
+                for start in range(0, batch.num_rows, self.batch_rows):
+                    yield batch.slice(start, self.batch_rows)
+
+        return names, batches()
+
+    def batch_lines(self, batch):
+        columns = [
+            self.as_strings(name, column)
+            for name, column in zip(batch.schema.names, batch.columns)
+        ]
+        for values in zip(*columns):
+            yield ["" if v is None else v for v in values]
+
+    def as_strings(self, name, column):
+        try:
+            return pyarrow.compute.cast(column, pyarrow.string()).to_pylist()
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+            raise ArrowFormatError(
+                f"Can't read column {name!r} ({column.type}) as text"
+            )
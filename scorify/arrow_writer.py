@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+"""
+Writes scored data to Parquet or Feather (Arrow IPC) files.
+
+Unlike CSV output, columns are typed: numeric columns (see
+ScoredData.numeric_columns) are written as float64, with blanks as nulls,
+and everything else is written as strings. Values go straight from the
+scored rows into Arrow arrays, a chunk of rows at a time, so streamed data is
+written as it's scored. Each chunk becomes a Parquet row group or an Arrow
+record batch.
+
+Keep rows don't fit in typed columns, so they're stored as JSON in the
+schema's metadata, under b"scorify.keep".
+
+pyarrow is optional; install it (or scorify[arrow]) to use these formats.
+"""
+
+from __future__ import absolute_import
+import json
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from scorify.scorer import Scorer, CHUNK_ROWS
+
+FORMATS = ("parquet", "feather")
+
+
+def available():
+    return pyarrow is not None
+
+
+def schema_for(scored_data, names):
+    fields = []
+    for col, name in zip(scored_data.header, names):
+        if col in scored_data.numeric_columns:
+            fields.append(pyarrow.field(name, pyarrow.float64()))
+        else:
+            fields.append(pyarrow.field(name, pyarrow.string()))
+    keep = [[row.get(h, "") for h in scored_data.header] for row in scored_data.keep]
+    metadata = {b"scorify.keep": json.dumps(keep).encode("utf-8")}
+    return pyarrow.schema(fields, metadata=metadata)
+
+
+def as_float(value):
+    # bool is an int, but it's not a number we'd have scored
+    if isinstance(value, (float, int)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def as_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def make_batch(rows, scored_data, schema):
+    arrays = []
+    for col, field in zip(scored_data.header, schema):
+        convert = as_float if col in scored_data.numeric_columns else as_str
+        values = [convert(row[col]) for row in rows]
+        arrays.append(pyarrow.array(values, type=field.type))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_scored_data(
+    scored_data, output, file_format, header_map=None, chunk_rows=CHUNK_ROWS
+):
+    """
+    Writes scored_data to output (a filename or binary file object) in
+    file_format, which is one of FORMATS. header_map works like it does for
+    CSV output.
+    """
+    if not available():
+        raise ArrowFormatError(
+            f"Writing {file_format} files needs pyarrow; try pip install pyarrow"
+        )
+    if file_format not in FORMATS:
+        raise ArrowFormatError(f"I don't know how to write {file_format!r} files")
+    names = [h.format_map(header_map) for h in scored_data.header]
+    schema = schema_for(scored_data, names)
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(output, schema)
+    else:
+        writer = pyarrow.ipc.new_file(output, schema)
+    with writer:
+        for chunk in Scorer.chunks(scored_data, chunk_rows):
+            writer.write_batch(make_batch(chunk, scored_data, schema))
+
+
+class ArrowFormatError(ValueError):
+    pass
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+"""
+Checkpoints for scoring CSV datafiles that only ever grow at the end.
+
+A checkpoint records how far into a datafile we've scored (as a byte offset
+and a count of CSV records), a hash of the file up to there, the size of the
+output we wrote, and the settings we scored with. Next time, if the settings
+are the same, the output hasn't changed size, and the datafile still starts
+with the same bytes, only the records after the offset need scoring, and
+their rows can be appended to the output. Otherwise, everything gets scored
+again.
+
+A last record without a newline might still be being written, so the
+checkpoint stops just before it, and also records the size of the output
+without its rows. Next time, those rows are cut off the output and the
+record is read again.
+"""
+
+from __future__ import absolute_import
+
+import csv
+import hashlib
+import json
+import os
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class Checkpoint(object):
+    def __init__(
+        self,
+        settings,
+        offset=0,
+        records=0,
+        prefix_digest=None,
+        output_size=None,
+        written_size=None,
+    ):
+        self.settings = settings
+        self.offset = offset
+        self.records = records
+        self.prefix_digest = prefix_digest
+        # The output's size with the rows from the first records records,
+        # and its size with everything we wrote
+        self.output_size = output_size
+        self.written_size = written_size
+
+    @classmethod
+    def load(kls, filename):
+        """
+        The checkpoint saved in filename, or None if there isn't a usable one.
+        """
+        try:
+            with open(filename) as f:
+                saved = json.load(f)
+            return kls(
+                saved["settings"],
+                saved["offset"],
+                saved["records"],
+                saved["prefix_digest"],
+                saved["output_size"],
+                saved.get("written_size"),
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, filename):
+        # Write and then rename, so a crash can't leave half a checkpoint
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, "w") as f:
+            json.dump(self.__dict__, f, indent=2)
+        os.replace(temp_filename, filename)
+
+    def resume_digest(self, data_file, settings, output):
+        """
+        If we can pick up where this checkpoint left off, returns a hash of
+        the first offset bytes of data_file (a binary file), which can be
+        updated with the rest of the file. Otherwise, returns None.
+        """
+        if settings != self.settings or self.prefix_digest is None:
+            return None
+        written_size = self.output_size
+        if self.written_size is not None:
+            written_size = self.written_size
+        try:
+            if os.path.getsize(output) != written_size:
+                return None
+        except OSError:
+            return None
+        digest = hashlib.sha256()
+        data_file.seek(0)
+        remaining = self.offset
+        while remaining > 0:
+            block = data_file.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                # The file got shorter
+                return None
+            digest.update(block)
+            remaining -= len(block)
+        if digest.hexdigest() != self.prefix_digest:
+            return None
+        return digest
+
+    def rewind_output(self, output):
+        """
+        Cuts any rows after the first records records off output.
+        """
+        if os.path.getsize(output) > self.output_size:
+            os.truncate(output, self.output_size)
+
+    def counted(self, records):
+        """
+        Passes records through, counting them.
+        """
+        for record in records:
+            self.records += 1
+            yield record
+
+
+class OffsetLines(object):
+    """
+    The lines of a binary file, decoded, starting at offset. Read CSV
+    records from them with records(): after each record, offset is just past
+    the end of that record, and the record's lines have been added to
+    digest (if there is one).
+    """
+
+    def __init__(self, data_file, offset=0, digest=None, encoding="utf-8"):
+        self.data_file = data_file
+        self.offset = offset
+        self.digest = digest
+        self.encoding = encoding
+        self.pending = []
+        self.complete = True
+        self.tail = None
+
+    def __iter__(self):
+        self.data_file.seek(self.offset)
+        read_offset = self.offset
+        for raw in self.data_file:
+            # Skip any byte order mark, like reading with utf-8-sig does
+            encoding = "utf-8-sig" if read_offset == 0 else self.encoding
+            read_offset += len(raw)
+            self.pending.append(raw)
+            yield raw.decode(encoding)
+
+    def records(self, dialect="excel", keep=0):
+        """
+        CSV records from the lines. A last record that doesn't end with a
+        newline isn't finished as far as offset and digest are concerned,
+        and unless it's one of the first keep records, it's held back in
+        tail instead of being returned.
+        """
+        for count, record in enumerate(csv.reader(self, dialect=dialect)):
+            if not self.pending[-1].endswith(b"\n"):
+                self.complete = False
+                if count >= keep:
+                    self.tail = record
+                    return
+                yield record
+                continue
+            for raw in self.pending:
+                self.offset += len(raw)
+                if self.digest is not None:
+                    self.digest.update(raw)
+            self.pending = []
+            yield record
@@ -8,51 +8,119 @@ Reads data files (or CSV objects) into datafile objects.
 Datafiles are iterable and indexable by column name. When reading, you pass
 in a scoresheet.LayoutSection, which tells you where data and header sections
 are.
+
+Datafiles can also be streamed: stream() reads the header and keep lines, and
+leaves data as an iterator that reads rows only as they're needed.
+
+ColumnarDatafile stores its data as one Column per header name instead of one
+dict per row, which takes much less memory for wide files and lets you get
+whole columns at once.
+
+If you pass use_columns, only those columns (after renaming) are kept when
+reading; everything else in the file is dropped as each line is parsed.
 """
 from __future__ import absolute_import
+import array
 import warnings
 
 from scorify.errors import HaystackError
 
 
 class Datafile(object):
-    def __init__(self, lines, layout_section, rename_section):
+    columnar = False
+
+    def __init__(self, lines, layout_section, rename_section, use_columns=None):
         self.lines = lines
         self.layout_section = layout_section
         self.rename_section = rename_section
+        self.use_columns = use_columns
+        # Maps header names to their position in the file's lines, when
+        # that's not just their position in the header
+        self.positions = None
+        self.file_header = []
         self.header = []
         self.keep = []
         self.data = []
+        self.streaming = False
         super(Datafile, self).__init__()
 
     def read(self):
+        self.read_header()
+        self.data = list(self.iter_data())
+
+    def stream(self):
+        """
+        Like read(), but only reads up through the header and keep lines.
+        After this, data is a one-pass iterator that reads rows from lines as
+        they're consumed, so the file never needs to be in memory all at once.
+        """
+        self.read_header()
+        self.data = self.iter_data()
+        self.streaming = True
+
+    def data_start(self):
+        """
+        The line number where data begins; everything before it is a header,
+        skip, or keep line.
+        """
+        for line_num, directive in enumerate(self.layout_section.directives):
+            if directive.info == "data":
+                return line_num
+        return len(self.layout_section.directives)
+
+    def read_header(self):
+        self.positions = None
+        self.file_header = []
         self.header = []
         self.data = []
         self.keep = []
-        for line_num, line in enumerate(self.lines):
+        self.line_iter = iter(self.lines)
+        for line_num in range(self.data_start()):
+            try:
+                line = next(self.line_iter)
+            except StopIteration:
+                return
             # Since we assume layout_section is valid, we only care about
-            # header and skip and keep lines -- everything else must be data.
-            line_type = ""
-            if line_num < len(self.layout_section.directives):
-                line_type = self.layout_section.directives[line_num].info
+            # header and skip and keep lines -- data comes after these.
+            line_type = self.layout_section.directives[line_num].info
             if line_type == "skip":
                 continue
             if line_type == "header":
-                self.header = [self.rename_section.map_name(h.strip()) for h in line]
-                # Warn if header contains duplicates
-                # Don't warn if there's a duplicate blank header, which we see from Excel input sometimes
-                seen = set()
-                duplicates = set(
-                    x for x in self.header if x in seen or (x != "" and seen.add(x))
-                )
-                if len(duplicates) > 0:
-                    warnings.warn(
-                        f"Duplicates {duplicates} in header {self.header}", UserWarning
-                    )
+                self.set_header(line)
             elif line_type == "keep":
                 self.append_keep(line)
-            else:
-                self.append_data(line)
+
+    def set_header(self, line):
+        header = [self.rename_section.map_name(h.strip()) for h in line]
+        # Warn if header contains duplicates
+        # Don't warn if there's a duplicate blank header, which we see from Excel input sometimes
+        seen = set()
+        duplicates = set(x for x in header if x in seen or (x != "" and seen.add(x)))
+        if len(duplicates) > 0:
+            warnings.warn(f"Duplicates {duplicates} in header {header}", UserWarning)
+        self.file_header = header
+        if self.use_columns is None:
+            self.header = header
+            return
+        # Like dict(zip()), the last of any duplicate names wins
+        positions = dict(
+            (name, i) for i, name in enumerate(header) if name in self.use_columns
+        )
+        self.header = list(positions.keys())
+        self.positions = positions
+
+    def known_columns(self):
+        """
+        All the column names in the file, including any we didn't keep.
+        """
+        return self.file_header or self.header
+
+    def iter_data(self):
+        """
+        Yields the remaining lines as data rows. Call read_header() first.
+        """
+        for line in self.line_iter:
+            yield self.make_row(line)
 
     def pad_data(self, data):
         # Force lines of funny length to be the header's length
@@ -60,24 +128,27 @@ class Datafile(object):
         padding = [""] * len_diff
         return data + padding
 
-    def append_data(self, data):
+    def make_row(self, data):
+        if self.positions is not None:
+            line_length = len(data)
+            return dict(
+                (name, data[i] if i < line_length else "")
+                for name, i in self.positions.items()
+            )
         full_line = self.pad_data(data)
-        self.data.append(dict(zip(self.header, full_line)))
+        return dict(zip(self.header, full_line))
+
+    def append_data(self, data):
+        self.data.append(self.make_row(data))
 
     def append_keep(self, data):
-        full_line = self.pad_data(data)
-        self.keep.append(dict(zip(self.header, full_line)))
+        self.keep.append(self.make_row(data))
 
     def apply_exclusions(self, exclusion_section):
-        new_data = []
-        for row in self.data:
-            try:
-                exclude = any([e.excludes(row) for e in exclusion_section])
-            except KeyError as exc:
-                raise ExclusionError("data columns", str(exc), self.data.header)
-            if not exclude:
-                new_data.append(row)
-        self.data = new_data
+        index = ExclusionIndex(exclusion_section)
+        index.check_columns(self)
+        rows = index.filter(self.data)
+        self.data = rows if self.streaming else list(rows)
 
     def __len__(self):
         return len(self.data)
@@ -89,5 +160,185 @@ class Datafile(object):
         return self.data[item]
 
 
+class Column(object):
+    """
+    One column of data. Each distinct value is stored once in levels, and
+    each cell is stored as an index into levels -- survey data tends to have
+    only a handful of distinct values per column, so this is quite compact.
+    """
+
+    def __init__(self, values=None):
+        self.levels = []
+        self.level_codes = {}
+        self.codes = array.array("I")
+        for value in values or []:
+            self.append(value)
+
+    def append(self, value):
+        code = self.level_codes.get(value)
+        if code is None:
+            code = len(self.levels)
+            self.levels.append(value)
+            self.level_codes[value] = code
+        self.codes.append(code)
+
+    def take(self, indexes):
+        """
+        A new Column with only the cells at indexes, in that order.
+        """
+        taken = Column()
+        taken.levels = self.levels
+        taken.level_codes = self.level_codes
+        taken.codes = array.array("I", (self.codes[i] for i in indexes))
+        return taken
+
+    def values(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return map(self.levels.__getitem__, self.codes)
+
+    def __getitem__(self, item):
+        return self.levels[self.codes[item]]
+
+
+class ColumnarDatafile(Datafile):
+    """
+    A Datafile that stores data as a Column per header name. Rows are still
+    available as dicts through iteration and indexing, but they're built on
+    request rather than stored.
+
+    If the header has duplicate names, the last column with that name wins,
+    just like Datafile.
+    """
+
+    columnar = True
+
+    def __init__(self, lines, layout_section, rename_section, use_columns=None):
+        self.columns = {}
+        self._header = []
+        super(ColumnarDatafile, self).__init__(
+            lines, layout_section, rename_section, use_columns
+        )
+
+    @property
+    def header(self):
+        return self._header
+
+    @header.setter
+    def header(self, header):
+        self._header = header
+        # dict() keeps the first position of each name but the last value,
+        # which gives us the same last-one-wins behavior as dict(zip()).
+        # When we're only using some columns, set_header() will replace these
+        # with positions in the file's lines.
+        self.positions = dict((name, i) for i, name in enumerate(header))
+        self.columns = dict((name, Column()) for name in self.positions)
+
+    @property
+    def data(self):
+        return self
+
+    @data.setter
+    def data(self, rows):
+        self.columns = dict((name, Column()) for name in self.positions)
+        for row in rows:
+            for name, column in self.columns.items():
+                column.append(row[name])
+
+    def stream(self):
+        # Columns only make sense once every row is in them
+        raise ValueError("Columnar datafiles are read all at once, not streamed")
+
+    def read(self):
+        self.read_header()
+        for line in self.line_iter:
+            self.append_data(line)
+
+    def append_data(self, data):
+        line_length = len(data)
+        for name, i in self.positions.items():
+            self.columns[name].append(data[i] if i < line_length else "")
+
+    def apply_exclusions(self, exclusion_section):
+        index = ExclusionIndex(exclusion_section)
+        index.check_columns(self)
+        excluded = [False] * len(self)
+        for name, values in index.values_by_column.items():
+            # Check each distinct value once, then just look at the codes
+            column = self.columns[name]
+            excluded_codes = set(
+                code
+                for code, level in enumerate(column.levels)
+                if str(level).strip() in values
+            )
+            if not excluded_codes:
+                continue
+            for i, code in enumerate(column.codes):
+                if code in excluded_codes:
+                    excluded[i] = True
+        indexes = [i for i, exclude in enumerate(excluded) if not exclude]
+        self.columns = dict(
+            (name, column.take(indexes)) for name, column in self.columns.items()
+        )
+
+    def column(self, name):
+        return self.columns[name]
+
+    def row(self, index):
+        return dict((name, column[index]) for name, column in self.columns.items())
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __iter__(self):
+        names = list(self.columns.keys())
+        for values in zip(*self.columns.values()):
+            yield dict(zip(names, values))
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("row index out of range")
+        return self.row(item)
+
+
+class ExclusionIndex(object):
+    """
+    Exclude directives compiled into a set of excluded values for each
+    column, so checking a row costs one lookup per excluded column no matter
+    how many values are excluded. Works as a filter on any iterable of rows,
+    so it's fine for streaming.
+    """
+
+    def __init__(self, exclusions):
+        self.values_by_column = {}
+        for e in exclusions:
+            self.values_by_column.setdefault(e.column, set()).add(e.value)
+
+    def check_columns(self, datafile):
+        for column in self.values_by_column:
+            if column not in datafile.header:
+                raise ExclusionError("data columns", column, datafile.known_columns())
+
+    def excludes(self, row):
+        for column, values in self.values_by_column.items():
+            if str(row[column]).strip() in values:
+                return True
+        return False
+
+    def filter(self, rows):
+        excludes = self.excludes
+        for row in rows:
+            if not excludes(row):
+                yield row
+
+
 class ExclusionError(HaystackError):
     pass
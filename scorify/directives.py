@@ -111,17 +111,31 @@ class Transform(object):
     transform reverse map(1:5, 5:1)
 
     If the third parameter is not specified, the identity mapping is assumed.
+
+    Call enable_cache() to remember results for recently-seen values.
     """
 
     def __init__(self, name, fx_def):
         self.name = name
         self.fx_def = fx_def
         self.mapping = mappings.Mapping.from_string(fx_def)
+        self.cache = None
         super(Transform, self).__init__()
 
+    def enable_cache(self, maxsize):
+        # Caching the identity would just be extra work
+        if isinstance(self.mapping, mappings.Identity):
+            return
+        self.cache = mappings.MemoCache(maxsize)
+
     def transform(self, value):
+        if self.cache is not None:
+            return self.cache.lookup(value, self.mapping.transform)
         return self.mapping.transform(value)
 
+    def transform_many(self, values):
+        return self.mapping.transform_many(values)
+
 
 class Score(object):
     """
@@ -164,6 +178,7 @@ class Aggregator(object):
             fname, fx, to_use = aggregators.parse_expr(aggregation_expr)
             self.agg_fx = fx
             self.to_use = to_use
+            self.numeric = aggregators.is_numeric(fx)
 
         except aggregators.AggregatorError as exc:
             raise DirectiveError(str(exc))
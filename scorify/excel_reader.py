@@ -1,28 +1,47 @@
-class ExcelReader():
+import openpyxl
+
+
+class ExcelReader(object):
     """
-    We need to mimic csv.Reader's line_num property on row_values
+    Reads an Excel worksheet like csv.reader: it's iterable, returns a list of
+    strings per row, and keeps line_num up to date (it's the number of rows
+    read so far, so it's the line number of the row you just got).
 
-    NOTE: This is not working correctly yet
+    Use ExcelReader.open() to read a sheet from a file. It opens the workbook
+    in openpyxl's read-only mode, which reads rows from the file as you ask
+    for them instead of loading the whole workbook first, and closes the
+    workbook when you reach the end.
     """
-    def __init__(self, sheet):
+
+    def __init__(self, sheet, workbook=None):
         self.sheet = sheet
-        self.line_num = -1
+        self.workbook = workbook
+        self.line_num = 0
         self.iterator = sheet.iter_rows(values_only=True)
 
+    @classmethod
+    def open(kls, filename, sheet_number=0):
+        workbook = openpyxl.load_workbook(filename, read_only=True)
+        try:
+            sheet = workbook[workbook.sheetnames[sheet_number]]
+        except IndexError:
+            workbook.close()
+            raise
+        return kls(sheet, workbook)
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
 
     def __iter__(self):
         return self
 
     def __next__(self):
+        try:
+            row = next(self.iterator)
+        except StopIteration:
+            self.close()
+            raise
         self.line_num += 1
-        if self.line_num >= self.sheet.max_row:
-            raise StopIteration()
-
-        def xstr(s):
-            if s is None:
-                return ''
-            return str(s)
-
-        # list, because openpyxl seems to build a tuple
-        return list(map(xstr, next(self.iterator)))
-
+        return ["" if value is None else str(value) for value in row]
@@ -4,6 +4,11 @@
 
 from __future__ import division, absolute_import
 import re
+from collections import OrderedDict
+
+from scorify import utils
+
+NaN = float("nan")
 
 """
 A set (right now, just two) of functions that can transform cells in input
@@ -14,10 +19,16 @@ The two functions are:
 Identity: (doesn't change anything)
 LinearMapping: Change a variable from one domain to
 another (eg, from 1:5 to 5:1)
+
+Mappings can also transform a whole column at once with transform_many(),
+which gives the same results as calling transform() on each value, except
+that values transform() would raise a ValueError for become NaN.
 """
 
 
 class Mapping(object):
+    # Whether transform() always gives numbers (or raises ValueError)
+    numeric = False
 
     def __init__(self):
         super(Mapping, self).__init__()
@@ -25,6 +36,17 @@ class Mapping(object):
     def transform(self, value):
         return None
 
+    def transform_many(self, values):
+        # Transform each distinct value once, and then spread the results out
+        codes, levels = utils.factorize(values)
+        transformed = []
+        for level in levels:
+            try:
+                transformed.append(self.transform(level))
+            except ValueError:
+                transformed.append(NaN)
+        return utils.take(transformed, codes)
+
     @classmethod
     def from_string(kls, fx_string=""):
         if fx_string == "" or fx_string.find("i") == 0:
@@ -59,6 +81,7 @@ map\(\s*
 
 
 class LinearMapping(Mapping):
+    numeric = True
 
     def __init__(self, input_domain, output_domain):
         super(LinearMapping, self).__init__()
@@ -91,6 +114,15 @@ class LinearMapping(Mapping):
         out_first = self.output_domain[0]
         return (val_float - in_first) * (out_range / in_range) + out_first
 
+    def transform_many(self, values):
+        # The same arithmetic as transform(), so the results are identical
+        floats, _invalid = utils.to_float_array(values)
+        in_range = self.input_domain[1] - self.input_domain[0]
+        out_range = self.output_domain[1] - self.output_domain[0]
+        in_first = self.input_domain[0]
+        out_first = self.output_domain[0]
+        return ((floats - in_first) * (out_range / in_range) + out_first).tolist()
+
     @classmethod
     def from_string(kls, fx_string):
         result = linear_mapping_re.match(fx_string)
@@ -152,5 +184,43 @@ class PassthroughMapping(DiscreteMapping):
         return self.map_dict.get(value, value)
 
 
+class MemoCache(object):
+    """
+    Remembers the results of a transform function for the most recent maxsize
+    distinct string values -- survey columns usually only have a handful of
+    distinct values, so most cells can skip the work entirely. ValueErrors are
+    remembered too, and raised again on hits.
+
+    Non-string values aren't cached, since values like 1 and 1.0 would share
+    a cache entry.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, value, fx):
+        if type(value) is not str:
+            return fx(value)
+        try:
+            result, failed = self.entries[value]
+            self.entries.move_to_end(value)
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            try:
+                result, failed = fx(value), False
+            except ValueError as exc:
+                result, failed = exc.args, True
+            self.entries[value] = (result, failed)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        if failed:
+            raise ValueError(*result)
+        return result
+
+
 class MappingError(ValueError):
     pass
@@ -15,17 +15,24 @@ Options:
                          'excel-tab' [default: excel]
   --imputation           Use mean substitution for missing values; the
                          default is to use list-wise deletion
+  --bootstrap=<n>        Resample participants this many times for 95%
+                         confidence intervals of each alpha [default: 0]
+  --seed=<n>             Seed for the bootstrap, to get the same intervals
+                         every time
+  --jobs=<n>             Run the bootstrap in this many processes at once
+                         [default: 1]
+  --metrics=<list>       Also print these coefficients for each measure,
+                         separated by commas: alpha, omega, lambda2,
+                         lambda6, split-half, mean-r, or all
   --output=<file>        An output file to write to [default: STDOUT]
   -q --quiet             Don't print errors
   -v, --verbose          Print extra debugging output
 """
 
-import os
-import io
 import sys
 import logging
+import warnings
 import csv
-import openpyxl
 import math
 import pandas as pd
 import numpy as np
@@ -36,10 +43,24 @@ from docopt import docopt
 from schema import Schema, Use, Or, And, SchemaError
 from scorify import scoresheet, datafile
 from scorify.excel_reader import ExcelReader
+from scorify.arrow_reader import ArrowReader, is_arrow_file
+from scorify import utils
+from scorify.scorer import map_in_pool
+from scorify.utils import open_by_extension
 
 
 def open_for_read(fname):
-    return io.open(os.path.expanduser(fname), 'r', encoding='utf-8-sig')
+    return open_by_extension(fname, 'r', encoding='utf-8-sig')
+
+
+def parse_metrics(metrics):
+    names = [name.strip() for name in metrics.lower().split(',')]
+    if 'all' in names:
+        return list(METRICS)
+    for name in names:
+        if name not in METRICS:
+            raise ValueError("Unknown metric: {0}".format(name))
+    return names
 
 
 def validate_arguments(arguments):
@@ -54,6 +75,17 @@ def validate_arguments(arguments):
             Use(str.lower),
             lambda s: s in ['excel', 'excel-tab'],
             error="Dialect must be excel or excel-tab"),
+        '--bootstrap': And(
+            Use(int), lambda n: n >= 0,
+            error="--bootstrap must be a number of resamples"),
+        '--seed': Or(None, And(
+            Use(int), lambda n: n >= 0,
+            error="--seed must be a non-negative integer")),
+        '--jobs': And(
+            Use(int), lambda n: n > 0, error="--jobs must be at least 1"),
+        '--metrics': Or(None, Use(
+            parse_metrics,
+            error="--metrics must be some of: " + ", ".join(METRICS))),
         str: object  # Ignore extras
     })
     try:
@@ -85,11 +117,11 @@ def main_test(test_args):
     compute_reliability(parse_arguments(test_args))
 
 
-def read_data(input_filename, dialect, page_number=0):
+def read_data(input_filename, dialect, page_number=0, columns=None):
     if input_filename.name.endswith("xls") or input_filename.name.endswith("xlsx"):
-        workbook = openpyxl.load_workbook(input_filename)
-        workbook_page = workbook[workbook.sheetnames[page_number]]
-        return ExcelReader(workbook_page)
+        return ExcelReader.open(input_filename.name, page_number)
+    elif is_arrow_file(input_filename.name):
+        return ArrowReader(input_filename.name, columns)
     else:
         return csv.reader(input_filename, dialect=dialect)
 
@@ -106,12 +138,19 @@ def load_scoresheet(filename, dialect):
 
 
 def load_datafile(filename, dialect, page_number, exclusions, sheet):
-    raw_data = read_data(filename, dialect, page_number)
-    data = datafile.Datafile(raw_data, sheet.layout_section, sheet.rename_section)
-    data.read()
+    exclusions_scoresheet = None
+    use_columns = sheet.referenced_columns()
     if exclusions is not None:
         exclusions_data = read_data(exclusions, dialect=dialect)
         exclusions_scoresheet = scoresheet.Reader(exclusions_data).read_into_scoresheet()
+        use_columns.update(exclusions_scoresheet.referenced_columns())
+    raw_data = read_data(
+        filename, dialect, page_number,
+        sheet.rename_section.original_names(use_columns))
+    data = datafile.ColumnarDatafile(
+        raw_data, sheet.layout_section, sheet.rename_section, use_columns)
+    data.read()
+    if exclusions_scoresheet is not None:
         try:
             data.apply_exclusions(exclusions_scoresheet.exclude_section)
         except datafile.ExclusionError as err:
@@ -121,79 +160,440 @@ def load_datafile(filename, dialect, page_number, exclusions, sheet):
     return data
 
 
-def get_alpha(df):
-    n = df.shape[1]
-    if (n <= 1):
-        return 1.0
+# The most principal axis factoring iterations to fit for omega
+OMEGA_ITERATIONS = 100
 
-    # the 'Sigma_i(v_t)' in the numerator
-    sum_variance = df.var().sum()
 
-    # the 'v_t' in the denominator
-    total_variance = df.sum(axis=1).var()
+def get_alpha(df):
+    return MeasureStats(df).alpha
 
-    if (total_variance == 0):
-        logging.warning("Chronbach's alpha failed: returning NaN")
-        return float('NaN')
 
-    result = (n/(n-1)) * (1 - (sum_variance / total_variance))
-    return result
+def cronbach_alpha(n, sum_variance, total_variance):
+    """
+    Cronbach's alpha for n items, given the sum of their variances and the
+    variance of their total. Works on arrays of variances, too.
+    """
+    if (n <= 1):
+        return np.ones_like(total_variance, dtype=float)[()]
+    total_variance = np.asarray(total_variance, dtype=float)
+    if np.any(total_variance == 0):
+        logging.warning("Chronbach's alpha failed: returning NaN")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = (n/(n-1)) * (1 - (sum_variance / total_variance))
+    return np.where(total_variance == 0, np.nan, result)[()]
+
+
+def rest_variances(variances, total_covs, total_variance):
+    """
+    For each item, the variance of the total of all the other items, given
+    the items' variances, their covariances with the total, and the total's
+    variance. Items are on the last axis.
+    """
+    total_variance = np.asarray(total_variance)[..., np.newaxis]
+    return total_variance - 2 * total_covs + variances
+
+
+def alphas_if_deleted(variances, total_covs, total_variance):
+    """
+    Cronbach's alpha without each item, from the same statistics as
+    rest_variances().
+    """
+    sum_variance = np.sum(variances, axis=-1, keepdims=True)
+    return cronbach_alpha(
+        np.shape(variances)[-1] - 1,
+        sum_variance - variances,
+        rest_variances(variances, total_covs, total_variance))
+
+
+class MeasureStats(object):
+    """
+    The statistics we report for one measure, all worked out from its items'
+    means and covariance matrix, which take just one pass over the data.
+    The same statistics for the measure with any one item left out, each
+    item's corrected item-total correlation, and all of the coefficients in
+    METRICS come from those algebraically, so they don't need any more
+    passes.
+    """
+
+    def __init__(self, df):
+        values = df.to_numpy(dtype=float)
+        self.items = list(df.columns)
+        self.item_count = len(self.items)
+        self.count = len(values)
+        self.means = values.mean(axis=0)
+        self.cov = np.atleast_2d(np.cov(values.T))
+        self.variances = np.diag(self.cov)
+        # Each item's covariance with the total, and the total's variance
+        self.total_covs = self.cov.sum(axis=1)
+        self.total_variance = self.total_covs.sum()
+
+        # np.mean() and np.std() of all of the cells
+        self.second_moments = (
+            self.variances * (self.count - 1) / self.count + self.means ** 2)
+        self.mean = self.means.mean()
+        self.stdev = np.sqrt(max(self.second_moments.mean() - self.mean ** 2, 0))
+        self.alpha = cronbach_alpha(
+            self.item_count, self.variances.sum(), self.total_variance)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sds = np.sqrt(self.variances)
+            self.corr = self.cov / np.outer(sds, sds)
+
+    def if_deleted(self):
+        """
+        Arrays of the mean, stdev, and alpha for the measure without each
+        of its items.
+        """
+        k = self.item_count - 1
+        means = (self.means.sum() - self.means) / k
+        second_moments = (self.second_moments.sum() - self.second_moments) / k
+        stdevs = np.sqrt(np.maximum(second_moments - means ** 2, 0))
+        alphas = alphas_if_deleted(
+            self.variances, self.total_covs, self.total_variance)
+        return means, stdevs, alphas
+
+    def rest_variances(self):
+        """
+        The variance of the total of all the other items, for each item.
+        """
+        return rest_variances(
+            self.variances, self.total_covs, self.total_variance)
+
+    def item_total_r(self):
+        """
+        Each item's correlation with the total of all the other items.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self.total_covs - self.variances) / np.sqrt(
+                self.variances * self.rest_variances())
+
+    def off_diagonal(self, matrix):
+        return matrix[~np.eye(self.item_count, dtype=bool)]
+
+    def mean_r(self):
+        """
+        The average correlation between two different items.
+        """
+        if self.item_count < 2:
+            return float('NaN')
+        return self.off_diagonal(self.corr).mean()
+
+    def lambda2(self):
+        """
+        Guttman's lambda 2.
+        """
+        k = self.item_count
+        if k < 2 or self.total_variance == 0:
+            return float('NaN')
+        off_diagonal = np.sum(self.off_diagonal(self.cov) ** 2)
+        return (self.total_variance - self.variances.sum() +
+                np.sqrt(k / (k - 1) * off_diagonal)) / self.total_variance
+
+    def lambda6(self):
+        """
+        Guttman's lambda 6: each item's error variance is what's left over
+        after regressing it on all the other items.
+        """
+        if self.item_count < 2 or self.total_variance == 0:
+            return float('NaN')
+        try:
+            precision = np.linalg.inv(self.cov)
+        except np.linalg.LinAlgError:
+            logging.warning("Guttman's lambda 6 failed: returning NaN")
+            return float('NaN')
+        errors = 1 / np.diag(precision)
+        return 1 - errors.sum() / self.total_variance
+
+    def split_half(self):
+        """
+        The correlation between the totals of the odd and even items, with
+        the Spearman-Brown correction.
+        """
+        if self.item_count < 2:
+            return float('NaN')
+        odd = np.arange(self.item_count) % 2 == 0
+        even = ~odd
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = self.cov[np.ix_(odd, even)].sum() / np.sqrt(
+                self.cov[np.ix_(odd, odd)].sum() *
+                self.cov[np.ix_(even, even)].sum())
+            return 2 * r / (1 + r)
+
+    def loadings(self, iterations=OMEGA_ITERATIONS, tolerance=1e-6):
+        """
+        The items' standardized loadings on one factor, found by principal
+        axis factoring of the correlation matrix.
+        """
+        try:
+            # Start from each item's squared multiple correlation
+            communalities = 1 - 1 / np.diag(np.linalg.inv(self.corr))
+        except np.linalg.LinAlgError:
+            communalities = np.ones(self.item_count)
+        reduced = self.corr.copy()
+        for _ in range(iterations):
+            np.fill_diagonal(reduced, communalities)
+            values, vectors = np.linalg.eigh(reduced)
+            loadings = vectors[:, -1] * np.sqrt(max(values[-1], 0))
+            updated = np.minimum(loadings ** 2, 1)
+            done = np.max(np.abs(updated - communalities)) < tolerance
+            communalities = updated
+            if done:
+                break
+        # The sign of an eigenvector is arbitrary
+        if loadings.sum() < 0:
+            loadings = -loadings
+        return loadings
+
+    def omega(self):
+        """
+        McDonald's omega (total), from a one-factor fit.
+        """
+        if self.item_count < 2 or not np.all(np.isfinite(self.corr)):
+            return float('NaN')
+        loadings = self.loadings()
+        common = loadings.sum() ** 2
+        return common / (common + np.sum(1 - np.minimum(loadings ** 2, 1)))
+
+
+# How to work out each coefficient --metrics can ask for, from MeasureStats
+METRICS = {
+    'alpha': lambda stats: stats.alpha,
+    'omega': MeasureStats.omega,
+    'lambda2': MeasureStats.lambda2,
+    'lambda6': MeasureStats.lambda6,
+    'split-half': MeasureStats.split_half,
+    'mean-r': MeasureStats.mean_r,
+}
+
+
+# Resamples per bootstrap block; each block is one task for a worker process
+BOOTSTRAP_BLOCK = 500
+
+# At most this many (resample x participant) counts per block, to limit memory
+BOOTSTRAP_CELLS = 10 ** 7
+
+# The bootstrap's per-participant sums, in worker processes; see
+# init_bootstrap_worker()
+_bootstrap_sums = None
+
+
+class Bootstrap(object):
+    """
+    Bootstrap confidence intervals for each measure's alpha, and for its
+    alpha with each item deleted.
+
+    A resample is just how many times each participant got drawn, and alpha
+    (with or without any item) only needs sums over participants: of each
+    item, each item squared, each item times the total, the total, and the
+    total squared. So we work out those values for every participant once,
+    and a whole block of resamples is then one matrix product of their
+    counts with those values.
+
+    Each block gets its own random stream, spawned from one seed, so the
+    intervals depend on the seed but not on how many jobs there are.
+    """
+
+    def __init__(self, df, measures):
+        """
+        measures is a list of (measure, questions) pairs.
+        """
+        self.count = len(df)
+        self.measures = []
+        columns = []
+        start = 0
+        for measure, questions in measures:
+            # Centered, so the sums don't lose precision
+            values = df[questions].to_numpy(dtype=float)
+            values = values - values.mean(axis=0)
+            totals = values.sum(axis=1, keepdims=True)
+            columns.extend(
+                [values, values ** 2, values * totals, totals, totals ** 2])
+            width = 3 * len(questions) + 2
+            self.measures.append(
+                (measure, len(questions), slice(start, start + width)))
+            start += width
+        self.values = np.hstack(columns)
+
+    def block_sizes(self, resamples):
+        block = max(1, min(BOOTSTRAP_BLOCK, BOOTSTRAP_CELLS // self.count))
+        full, rest = divmod(resamples, block)
+        return [block] * full + ([rest] if rest else [])
+
+    def resample(self, resamples, seed_sequence, jobs=1):
+        """
+        Returns a dict of measure: (alphas, deleted_alphas), where alphas has
+        the measure's alpha for each resample, and deleted_alphas has a row
+        per resample and a column per item.
+        """
+        sizes = self.block_sizes(resamples)
+        blocks = zip(seed_sequence.spawn(len(sizes)), sizes)
+        if jobs > 1:
+            sums = map_in_pool(
+                resample_block, blocks, jobs,
+                init_bootstrap_worker, (self.values,))
+        else:
+            init_bootstrap_worker(self.values)
+            sums = map(resample_block, blocks)
+        return self.alphas(np.vstack(list(sums)))
+
+    def alphas(self, sums):
+        """
+        Alphas for resamples, from their rows of sums (see resample_block()).
+        """
+        n = self.count
+        results = {}
+        for measure, k, columns in self.measures:
+            measure_sums = sums[:, columns]
+            item_sums = measure_sums[:, :k]
+            total_sums = measure_sums[:, 3 * k]
+            variances = (
+                measure_sums[:, k:2 * k] - item_sums ** 2 / n) / (n - 1)
+            total_covs = (
+                measure_sums[:, 2 * k:3 * k] -
+                item_sums * total_sums[:, np.newaxis] / n) / (n - 1)
+            total_variance = (
+                measure_sums[:, 3 * k + 1] - total_sums ** 2 / n) / (n - 1)
+            alphas = cronbach_alpha(
+                k, variances.sum(axis=1), total_variance)
+            deleted = alphas_if_deleted(variances, total_covs, total_variance)
+            results[measure] = (alphas, deleted)
+        return results
+
+
+def init_bootstrap_worker(values):
+    global _bootstrap_sums
+    _bootstrap_sums = values
+
+
+def resample_block(block):
+    """
+    Draws size resamples of participants and returns the sums of each
+    resample's values (see Bootstrap), as a row per resample.
+    """
+    seed, size = block
+    n = len(_bootstrap_sums)
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, n, size=(size, n))
+    draws += np.arange(size)[:, np.newaxis] * n
+    counts = np.bincount(draws.ravel(), minlength=size * n)
+    return counts.reshape(size, n).astype(float) @ _bootstrap_sums
+
+
+def confidence_interval(values):
+    """
+    The 95% percentile interval of values, along the first axis.
+    """
+    # Columns of all NaN (say, an item with no variance) just give NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanpercentile(values, [2.5, 97.5], axis=0)
+
+
+# How many participants' distances to work out at once; see get_mahalanobis()
+MAHALANOBIS_CHUNK_ROWS = 10000
 
 
 # https://www.geeksforgeeks.org/how-to-calculate-mahalanobis-distance-in-python/
-def get_mahalanobis(df): 
-    y_mu = df - np.mean(df, axis=0)  # the axis=0 is mandatory here for newer versions of pandas
-    cov = np.cov(df.values.T) 
+def get_mahalanobis(df, chunk_rows=MAHALANOBIS_CHUNK_ROWS):
+    """
+    The squared Mahalanobis distance of each row of df from the mean of all
+    the rows, as an array -- or NaN if the covariance matrix can't be
+    inverted.
+
+    Rather than inverting the covariance matrix, we factor it once into
+    eigenvectors and eigenvalues, and use those to whiten the centered data:
+    a row's squared distance is then just its sum of squares. We do that
+    chunk_rows at a time, so memory use is proportional to the size of the
+    data, not the square of the number of participants.
+    """
+    values = df.to_numpy(dtype=float)
+    if len(values) < 2 or not np.all(np.isfinite(values)):
+        logging.warning("Mahalanobis failed: returning NaN")
+        return float('NaN')
+    y_mu = values - values.mean(axis=0)
+    cov = np.atleast_2d(np.cov(values.T))
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
 
     # apparently, it is possible for linalg.inv(cov) to succeed even though cov is
     # so ill-conditioned that the output is garbage for a floating point representation
     # https://stackoverflow.com/questions/13249108/efficient-pythonic-check-for-singular-matrix/13264934#13264934
     # https://stackoverflow.com/questions/31188979/is-numpy-linalg-inv-giving-the-correct-matrix-inverse-edit-why-does-inv-gi
-    if np.linalg.cond(cov) < 1/sys.float_info.epsilon:
-        i = np.linalg.inv(cov)
-    else:
+    # For a covariance matrix, the condition number is the ratio of its
+    # largest and smallest eigenvalues.
+    smallest = eigenvalues.min()
+    if not (smallest > 0 and eigenvalues.max() / smallest < 1/sys.float_info.epsilon):
         logging.warning("Mahalanobis failed: returning NaN")
         return float('NaN')
 
-    try:
-        inv_covmat = np.linalg.inv(cov) 
-    except:
-        # its probably singular
-        logging.warning("Mahalanobis failed: returning NaN")
-        return float('NaN')
-
-    logging.debug(inv_covmat)
-    left = np.dot(y_mu, inv_covmat) 
-    mahal = np.dot(left, y_mu.T) 
-    return mahal.diagonal() 
-  
- 
-def isnumber(x):
-    try:
-        float(x)
-        return True
-    except:
-        return False
-
-
-def print_row(a,b,c,d):
-    print(f"{a:>15}{b:>13}{c:>13}{d:>13}")
-
-
-def make_row(label, df):
-
-    numpy = df.to_numpy()
-    mean = np.mean(numpy)
-    stdev = np.std(numpy)
-    alpha = get_alpha(df)
-
-    # we could use pingouin instead
-    #(alpha, confidence) = pingouin.cronbach_alpha(df)
-
-    print_row(label,
-              f"{mean:11.4f}",
-              f"{stdev:6.4f}",
-              f"{alpha:6.4f}")
+    whitening = eigenvectors / np.sqrt(eigenvalues)
+    mahal = np.empty(len(values))
+    for start in range(0, len(values), chunk_rows):
+        whitened = np.dot(y_mu[start:start + chunk_rows], whitening)
+        mahal[start:start + chunk_rows] = np.einsum('ij,ij->i', whitened, whitened)
+    return mahal
+
+
+def mahalanobis_p(mahal, item_count):
+    """
+    The p value of each squared Mahalanobis distance; they follow a
+    chi-square distribution with one degree of freedom per item.
+    """
+    return sp.stats.chi2.sf(mahal, item_count)
+
+
+def to_floats(data, id_name, questions):
+    """
+    A DataFrame of the questions' answers as floats, indexed by participant
+    id, with NaN for any empty cells, strings, etc. Rows with no participant
+    id (e.g. if the csv had blank lines) are left out.
+    """
+    ids = data.column(id_name)
+    keep = [i for i, pid in enumerate(ids) if pid != '']
+    columns = [data.column(q).take(keep) for q in questions]
+    values, invalid = utils.to_float_matrix(columns)
+    for q, (blank, not_numeric) in zip(
+            questions, utils.coercion_counts(columns, invalid)):
+        if blank or not_numeric:
+            logging.info("{0}: {1} blank and {2} non-numeric values".format(
+                q, blank, not_numeric))
+    index = pd.Index([ids[i] for i in keep], name=id_name)
+    return pd.DataFrame(values, index=index, columns=questions)
+
+
+def print_row(first, *rest):
+    print(f"{first:>15}" + "".join(f"{column:>13}" for column in rest))
+
+
+def print_measure(measure, stats, resampled=None):
+    """
+    resampled, if there is one, is a pair of bootstrapped alphas and
+    deleted alphas, from Bootstrap.resample().
+    """
+    alpha_ci = []
+    deleted_ci = [[]] * stats.item_count
+    if resampled is not None:
+        alphas, deleted = resampled
+        alpha_ci = [f"{v:6.4f}" for v in confidence_interval(alphas)]
+        deleted_ci = [[f"{v:6.4f}" for v in interval]
+                      for interval in confidence_interval(deleted).T]
+    print_row(measure,
+              f"{stats.mean:11.4f}",
+              f"{stats.stdev:6.4f}",
+              f"{stats.alpha:6.4f}",
+              '',
+              *alpha_ci)
+    if stats.item_count < 2:
+        return
+    means, stdevs, alphas = stats.if_deleted()
+    item_total_r = stats.item_total_r()
+    for i, q in enumerate(stats.items):
+        # print mean, stdev, alpha for the measure omitting the question
+        print_row("omit " + q,
+                  f"{means[i]:11.4f}",
+                  f"{stdevs[i]:6.4f}",
+                  f"{alphas[i]:6.4f}",
+                  f"{item_total_r[i]:6.4f}",
+                  *deleted_ci[i])
 
 
 def compute_reliability(arguments):
@@ -203,29 +603,14 @@ def compute_reliability(arguments):
     logging.debug(validated)
     sheet = load_scoresheet(validated['<scoresheet>'], validated['--dialect'])
     id_name = sheet.score_section.participant_id_column_name
-    raw_data = load_datafile(validated['<datafile>'],
-                             validated['--dialect'],
-                             validated['--page-number'],
-                             validated['--exclusions'],
-                             sheet).data
-
-    # load the data indo a pandas dataframe
-    df = pd.DataFrame(data=raw_data)
-
-    # remove rows with no participant id, e.g. if csv had blank lines
-    df = df[df[id_name] != '']
+    data = load_datafile(validated['<datafile>'],
+                         validated['--dialect'],
+                         validated['--page-number'],
+                         validated['--exclusions'],
+                         sheet)
 
-    # name the rows with the ppt id's
-    df.set_index(df[id_name], inplace=True)
-
-    #remove metadata columns
-    df = df[sheet.score_section.all_questions]
-
-    # turn any empty cells, string, etc. into NaNs
-    df = df[df.applymap(isnumber)]
-
-    # turn everything into floats
-    df = df.applymap(float)
+    # load just the questions into a pandas dataframe, as floats
+    df = to_floats(data, id_name, sheet.score_section.all_questions)
 
     # get rid of NaNs
     if (validated['--imputation']):
@@ -233,18 +618,39 @@ def compute_reliability(arguments):
     else:
         df.dropna(inplace=True)
 
+    measures = [(measure, sheet.score_section.questions_by_measure[measure])
+                for measure in sheet.score_section.get_measures()]
+
+    resampled = {}
+    header = ['', 'mean', 'stdev', 'alpha', 'item-total r']
+    if validated['--bootstrap'] > 0 and len(df) < 2:
+        logging.warning(
+            "Can't bootstrap with {0} participants; skipping it".format(len(df)))
+    elif validated['--bootstrap'] > 0:
+        seed_sequence = np.random.SeedSequence(validated['--seed'])
+        logging.info("Bootstrap seed: {0}".format(seed_sequence.entropy))
+        resampled = Bootstrap(df, measures).resample(
+            validated['--bootstrap'], seed_sequence, validated['--jobs'])
+        header.extend(['alpha 2.5%', 'alpha 97.5%'])
+
+    stats = dict((measure, MeasureStats(df[questions]))
+                 for measure, questions in measures)
+
     # print header for measures section
     print("")
-    print_row('', 'mean', 'stdev', 'alpha')
+    print_row(*header)
 
     # handle the measures one at a time
-    for measure in sheet.score_section.get_measures():
-        questions = sheet.score_section.questions_by_measure[measure]
-        # print mean, stdev, alpha for the measure
-        make_row(measure, df[questions])
-        for q in questions:
-            # print mean, stdev, alpha for the measure omitting the question
-            make_row("omit " + q, df[questions].drop(q, axis=1, inplace=False))
+    for measure, questions in measures:
+        print_measure(measure, stats[measure], resampled.get(measure))
+
+    if validated['--metrics']:
+        print("")
+        print_row('', *validated['--metrics'])
+        for measure, questions in measures:
+            print_row(measure, *[
+                f"{METRICS[name](stats[measure]):6.4f}"
+                for name in validated['--metrics']])
 
     # print header for participants section
     print("")
@@ -258,12 +664,13 @@ def compute_reliability(arguments):
         # get the Mahalanobis distance for each participant
         df_measure['mahal'] = get_mahalanobis(df_measure)
 
-        # calculate p-value for each mahalanobis distance 
-        df_measure['p'] = 1 - sp.stats.chi2.cdf(df_measure['mahal'], 3) 
+        # calculate p-value for each mahalanobis distance
+        df_measure['p'] = mahalanobis_p(df_measure['mahal'], len(questions))
 
         # print out mahalanobis distance and p value for each participant
-        for participant, row in df_measure.iterrows():
-            print_row(participant, measure, f"{row['mahal']:6.4f}", f"{row['p']:6.4f}")
+        for participant, mahal, p in zip(
+                df_measure.index, df_measure['mahal'], df_measure['p']):
+            print_row(participant, measure, f"{mahal:6.4f}", f"{p:6.4f}")
 
 
 if __name__ == '__main__':
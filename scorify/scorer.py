@@ -3,18 +3,39 @@
 # Copyright (c) 2024 Board of Regents of the University of Wisconsin System
 from __future__ import absolute_import
 
-from collections import defaultdict
+import collections
+import itertools
+import multiprocessing
+from collections import defaultdict, namedtuple
+
+from scorify import aggregators, utils
 from scorify.errors import HaystackError
 
 NaN = float("nan")
 
+# How many rows to work on at once when streaming or working in parallel
+CHUNK_ROWS = 1000
+
 
 class ScoredData(object):
-    def __init__(self, header=None, keep=None, data=None, measure_columns=None):
+    def __init__(
+        self,
+        header=None,
+        keep=None,
+        data=None,
+        measure_columns=None,
+        streaming=False,
+        numeric_columns=None,
+    ):
         self.header = header or []
         self.data = data or []
         self.keep = keep or []
         self.measure_columns = measure_columns or defaultdict(list)
+        # When streaming, data is a one-pass iterator rather than a list
+        self.streaming = streaming
+        # Columns that only ever hold numbers (or NaN, or blank for missing
+        # columns); everything else may hold text
+        self.numeric_columns = numeric_columns or set()
 
     def columns_for(self, measure_list):
         out = []
@@ -56,68 +77,307 @@ class Scorer(object):
             mc[d.measure_name].append(kls.score_name(d))
         return mc
 
+    @classmethod
+    def compile(kls, transform_section, score_section):
+        return ScoringPlan(transform_section, score_section)
+
     @classmethod
     def score(kls, datafile, transform_section, score_section, ignore_missing=False):
-        out = ScoredData()
-        out.header = [kls.score_name(d) for d in score_section.directives]
-        out.measure_columns = kls.make_measure_columns(score_section)
+        plan = kls.compile(transform_section, score_section)
+        return kls.score_with_plan(datafile, plan, ignore_missing)
 
+    @classmethod
+    def scored_data_for(kls, datafile, plan):
+        """
+        An empty ScoredData with the plan's header and datafile's keep rows.
+        """
+        out = ScoredData()
+        out.header = list(plan.header)
+        out.measure_columns = plan.make_measure_columns()
+        out.numeric_columns = set(plan.numeric_names)
         for k in datafile.keep:
-            kept = {}
-            for d in score_section.directives:
-                name = kls.score_name(d)
-                try:
-                    kept[name] = k[d.column]
-                except KeyError as err:
-                    # No kept data for this column? No worries, just blank is fine
-                    kept[name] = ""
+            # No kept data for a column? No worries, just blank is fine
+            out.keep.append(dict((s.name, k.get(s.column, "")) for s in plan.steps))
+        return out
+
+    @classmethod
+    def score_with_plan(kls, datafile, plan, ignore_missing=False):
+        steps = plan.steps_for(datafile, ignore_missing)
+        out = kls.scored_data_for(datafile, plan)
+        if datafile.columnar:
+            out.data = kls.score_columns(datafile, steps)
+            return out
+        rows = kls.score_rows(datafile.data, steps)
+        out.streaming = datafile.streaming
+        out.data = rows if datafile.streaming else list(rows)
+        return out
 
-            out.keep.append(kept)
+    @classmethod
+    def score_columns(kls, datafile, steps):
+        # steps have transform_many() functions here; see ScoringPlan.steps_for
+        names = []
+        columns = []
+        for column, name, fx_many in steps:
+            names.append(name)
+            if fx_many is None:
+                columns.append([""] * len(datafile))
+            else:
+                columns.append(fx_many(datafile.column(column)))
+        return [dict(zip(names, values)) for values in zip(*columns)]
 
-        for r in datafile.data:
+    @classmethod
+    def score_rows(kls, rows, steps):
+        for r in rows:
             scored = {}
-            for s in score_section.directives:
+            for column, name, fx in steps:
+                if fx is None:
+                    scored[name] = ""
+                    continue
                 try:
-                    tx = transform_section[s.transform]
-                except KeyError as exc:
-                    raise TransformError(
-                        "transforms",
-                        "Key not found: " + s.transform,
-                        transform_section.known_transforms(),
-                    )
-
-                name = kls.score_name(s)
-                if ignore_missing and s.column not in r:
-                    sval = ""
-                else:
-                    try:
-                        sval = tx.transform(r[s.column])
-                    except KeyError as err:
-                        raise ScoringError("data columns", str(err), datafile.header)
-                    except ValueError:
-                        sval = NaN
-                scored[name] = sval
-            out.data.append(scored)
+                    scored[name] = fx(r[column])
+                except ValueError:
+                    scored[name] = NaN
+            yield scored
 
+    @classmethod
+    def score_parallel(
+        kls, datafile, plan, aggregatror_section, jobs, ignore_missing=False
+    ):
+        """
+        Scores datafile and adds measures, like score_with_plan() followed by
+        add_measures(), but splits the rows into chunks and works on them
+        in a pool of jobs processes. Each process gets the compiled plan and
+        measures once, when it starts. Rows come out in their original order.
+        """
+        steps = plan.steps_for(datafile, ignore_missing, batch=False)
+        out = kls.scored_data_for(datafile, plan)
+        measures = kls.prepare_measures(out, aggregatror_section)
+        chunks = kls.chunks(datafile.data, CHUNK_ROWS)
+        scored_chunks = map_in_pool(
+            score_chunk, chunks, jobs, init_score_worker, (steps, measures)
+        )
+        rows = itertools.chain.from_iterable(scored_chunks)
+        out.streaming = datafile.streaming
+        out.data = rows if datafile.streaming else list(rows)
         return out
 
+    @classmethod
+    def chunks(kls, rows, size):
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
     @classmethod
     def add_measures(kls, scored_data, aggregatror_section):
+        measures = kls.prepare_measures(scored_data, aggregatror_section)
+        if scored_data.streaming:
+            scored_data.data = kls.measure_chunks(scored_data.data, measures)
+        else:
+            kls.measure_block(scored_data.data, measures)
+
+    @classmethod
+    def prepare_measures(kls, scored_data, aggregatror_section):
+        """
+        Adds the measures to scored_data's header, and returns them in the
+        order they should be computed; see measure_order().
+        """
+        scored_columns = set(scored_data.header)
         for m in aggregatror_section.directives:
             scored_data.header.append(m.name)
-        for row in scored_data.data:
-            for m in aggregatror_section.directives:
-                try:
-                    cols = scored_data.columns_for(m.to_use)
-                except KeyError as exc:
-                    raise AggregationError(
-                        "measures", str(exc), scored_data.known_measures()
-                    )
-                vals = [row[col] for col in cols]
-                try:
-                    row[m.name] = m.agg_fx(vals)
-                except ValueError:
-                    row[m.name] = NaN
+            if m.numeric:
+                scored_data.numeric_columns.add(m.name)
+            else:
+                scored_data.numeric_columns.discard(m.name)
+        return kls.measure_order(scored_data, aggregatror_section, scored_columns)
+
+    @classmethod
+    def measure_order(kls, scored_data, aggregatror_section, scored_columns):
+        """
+        Works out which columns each measure uses (scored_columns are the
+        columns that were there before any measures), and returns a list of
+        (Aggregator, column names) pairs ordered so every measure comes after
+        any measures it uses. Unknown names raise AggregationError and
+        circular measures raise CircularMeasureError, before any rows are
+        touched.
+        """
+        measure_names = set(m.name for m in aggregatror_section.directives)
+        cols_for = {}
+        depends_on = {}
+        for m in aggregatror_section.directives:
+            try:
+                cols = scored_data.columns_for(m.to_use)
+            except KeyError as exc:
+                raise AggregationError(
+                    "measures", str(exc), scored_data.known_measures()
+                )
+            cols_for[m.name] = cols
+            # A scored column or measure_columns entry shadows a measure with
+            # the same name, just like in columns_for()
+            depends_on[m.name] = [
+                name
+                for name in m.to_use
+                if name in measure_names
+                and name not in scored_data.measure_columns
+                and name not in scored_columns
+            ]
+
+        ordered = []
+        done = set()
+        visiting = []
+
+        def visit(m):
+            if m.name in done:
+                return
+            if m.name in visiting:
+                cycle = visiting[visiting.index(m.name) :] + [m.name]
+                raise CircularMeasureError(
+                    "Measures depend on each other: " + " -> ".join(cycle)
+                )
+            visiting.append(m.name)
+            for name in depends_on[m.name]:
+                visit(by_name[name])
+            visiting.pop()
+            done.add(m.name)
+            ordered.append((m, cols_for[m.name]))
+
+        by_name = dict((m.name, m) for m in aggregatror_section.directives)
+        for m in aggregatror_section.directives:
+            visit(m)
+        return ordered
+
+    @classmethod
+    def measure_chunks(kls, rows, measures):
+        # Measures work a block of rows at a time, so when streaming, we
+        # gather rows into chunks to keep memory use bounded
+        for chunk in kls.chunks(rows, CHUNK_ROWS):
+            kls.measure_block(chunk, measures)
+            yield from chunk
+
+    @classmethod
+    def measure_block(kls, rows, measures):
+        """
+        Computes each measure for all of rows at once, and stores the results
+        in the rows. measures is a list of (Aggregator, column names) pairs.
+        """
+        if not rows:
+            return
+        for m, cols in measures:
+            columns = [[row[col] for row in rows] for col in cols]
+            matrix_fx = aggregators.matrix_version(m.agg_fx)
+            if matrix_fx is not None:
+                values, invalid = utils.to_float_matrix(columns)
+                results = matrix_fx(values, invalid).tolist()
+            else:
+                results = [kls.aggregate(m, vals) for vals in zip(*columns)]
+            for row, result in zip(rows, results):
+                row[m.name] = result
+
+    @classmethod
+    def aggregate(kls, m, vals):
+        try:
+            return m.agg_fx(list(vals))
+        except ValueError:
+            return NaN
+
+
+# Scoring state for worker processes; see Scorer.score_parallel()
+worker_steps = None
+worker_measures = None
+
+
+def init_score_worker(steps, measures):
+    global worker_steps, worker_measures
+    worker_steps = steps
+    worker_measures = measures
+
+
+def score_chunk(rows):
+    scored = list(Scorer.score_rows(rows, worker_steps))
+    Scorer.measure_block(scored, worker_measures)
+    return scored
+
+
+def map_in_pool(fx, items, jobs, initializer=None, initargs=()):
+    """
+    Like map(fx, items), but runs in a pool of jobs processes. Results come
+    back in order, and only a few items per process are in flight at once,
+    so items can be a long (or streaming) iterator.
+    """
+    with multiprocessing.Pool(jobs, initializer, initargs) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.apply_async(fx, (item,)))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+ScoreStep = namedtuple("ScoreStep", ["column", "name", "transform"])
+
+
+class ScoringPlan(object):
+    """
+    A score section compiled against a transform section: for each score
+    directive, the input column, the output name, and the Transform to apply.
+    All the lookups and name-building happen once, here, so scoring rows is
+    just a loop over steps. A plan doesn't depend on any particular datafile,
+    so you can reuse it to score as many files as you like.
+    """
+
+    def __init__(self, transform_section, score_section):
+        steps = []
+        for d in score_section.directives:
+            try:
+                tx = transform_section[d.transform]
+            except KeyError:
+                raise TransformError(
+                    "transforms",
+                    "Key not found: " + d.transform,
+                    transform_section.known_transforms(),
+                )
+            steps.append(ScoreStep(d.column, Scorer.score_name(d), tx))
+        self.steps = tuple(steps)
+        self.header = tuple(step.name for step in self.steps)
+        self.measure_names = tuple(d.measure_name for d in score_section.directives)
+        self.numeric_names = frozenset(
+            step.name for step in self.steps if step.transform.mapping.numeric
+        )
+
+    def make_measure_columns(self):
+        mc = defaultdict(list)
+        for measure_name, name in zip(self.measure_names, self.header):
+            mc[measure_name].append(name)
+        return mc
+
+    def steps_for(self, datafile, ignore_missing=False, batch=None):
+        """
+        Checks that datafile has every column we need, and returns a list of
+        (column, output name, transform function) tuples for scoring its rows.
+        If ignore_missing is set, missing columns get a transform function of
+        None, and should be scored as blank. If batch is set (which it is by
+        default for columnar datafiles), the transform functions work on
+        whole columns.
+        """
+        if batch is None:
+            batch = datafile.columnar
+        header = set(datafile.header)
+        fx_name = "transform_many" if batch else "transform"
+        steps = []
+        for step in self.steps:
+            if step.column in header:
+                fx = getattr(step.transform, fx_name)
+                steps.append((step.column, step.name, fx))
+            elif ignore_missing:
+                steps.append((step.column, step.name, None))
+            else:
+                raise ScoringError(
+                    "data columns", repr(step.column), datafile.known_columns()
+                )
+        return steps
 
 
 class TransformError(HaystackError):
@@ -130,3 +390,7 @@ class ScoringError(HaystackError):
 
 class AggregationError(HaystackError):
     pass
+
+
+class CircularMeasureError(ValueError):
+    pass
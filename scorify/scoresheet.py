@@ -23,6 +23,26 @@ class Scoresheet(object):
     def has_errors(self):
         return len(self.errors) > 0
 
+    def reads_like(self, other):
+        """
+        Whether this scoresheet reads datafiles the same way as other: the
+        same layout and the same renames.
+        """
+        return [d.info for d in self.layout_section] == [
+            d.info for d in other.layout_section
+        ] and self.rename_section.mapper == other.rename_section.mapper
+
+    def referenced_columns(self):
+        """
+        The names of the data columns (after renaming) that this scoresheet
+        uses; nothing else in a datafile matters for scoring it.
+        """
+        columns = set(d.column for d in self.score_section)
+        columns.update(d.column for d in self.exclude_section)
+        if self.score_section.participant_id_column_name is not None:
+            columns.add(self.score_section.participant_id_column_name)
+        return columns
+
 
 class Reader(object):
     def __init__(self, data=None):
@@ -166,6 +186,16 @@ class RenameSection(Section):
         # Default to the original.
         return self.mapper.get(name, name)
 
+    def original_names(self, names):
+        """
+        The names a datafile's columns might have before renaming, if we want
+        to end up with names.
+        """
+        names = set(names)
+        originals = set(name for name in names if name not in self.mapper)
+        originals.update(old for old, new in self.mapper.items() if new in names)
+        return originals
+
     def __raise_on_conflict(self, directive):
         conflict = next(
             (d for d in self.directives if directive.conflicts_with(d)), None
@@ -213,6 +243,10 @@ class TransformSection(Section):
     def known_transforms(self):
         return self.transform_dict.keys()
 
+    def enable_cache(self, maxsize):
+        for directive in self.directives:
+            directive.enable_cache(maxsize)
+
     def __getitem__(self, name):
         if str(name).strip() == "":
             return self.identity_transform
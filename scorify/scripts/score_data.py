@@ -6,7 +6,7 @@
 """Score questionnaire responses.
 
 Usage:
-  score_data [options] <scoresheet> <datafile>
+  score_data [options] [--also=<pair>]... <scoresheet> <datafile>
   score_data -h | --help
 
 Options:
@@ -16,34 +16,72 @@ Options:
   --sheet=<num>        If using an Excel datafile as input, what sheet
                        should we use? Indexed from 0. [default: 0]
   --nans-as=<string>   Print NaNs as this [default: NaN]
+  --float-places=<n>   Round numbers to this many decimal places [default: 2]
   --dialect=<dialect>  The dialect for CSV files; options are 'excel' or
                        'excel-tab' [default: excel]
   --output=<file>      An output file to write to (if blank, writes to STDOUT)
+  --checkpoint=<file>  Keep track of how much of the datafile has been scored
+                       in this file. Next time, if the datafile has only
+                       had rows added to the end, just score those and
+                       append them to the output. Needs --output, and only
+                       works with CSV files
+  --also=<pair>        Also score the datafile with another scoresheet, and
+                       write that to another output; give them as
+                       SCORESHEET:OUTPUT (SCORESHEET;OUTPUT on Windows).
+                       The datafile is only read once. Can be given more
+                       than once; can't be used with --stream
+  --format=<fmt>       The output format; options are 'csv', 'parquet', or
+                       'feather'. --nans-as, --float-places, and --dialect
+                       only apply to csv. [default: csv]
+  --stream             Score and write rows one at a time as they're read,
+                       instead of loading the whole datafile into memory
+  --columnar           Store the datafile by column rather than by row;
+                       uses much less memory for wide files
+  --jobs=<n>           Score rows in this many processes at once [default: 1]
+  --transform-cache=<n>  Remember transform results for up to this many
+                       distinct values per transform; 0 turns this off
+                       [default: 0]
   -q --quiet           Only print errors
   -v, --verbose        Print extra debugging output
 """
 
-import os
-import io
 import sys
 import logging
+import copy
+import hashlib
+import itertools
+import os
 import csv
-import openpyxl
+import operator
 
 import scorify
 from docopt import docopt
 from schema import Schema, Use, Or, And, SchemaError
-from scorify import scoresheet, datafile, scorer
-from scorify.utils import pp
+from scorify import scoresheet, datafile, scorer, arrow_writer, checkpoint
+from scorify.utils import make_pp, open_by_extension, compressed_opener, file_digest
 from scorify.excel_reader import ExcelReader
+from scorify.arrow_reader import ArrowReader, is_arrow_file
 
 logging.basicConfig(format="%(message)s")
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Buffer output files generously; we write a lot of small rows
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
 
 def open_for_read(fname):
-    return io.open(os.path.expanduser(fname), "r", encoding="utf-8-sig")
+    return open_by_extension(fname, "r", encoding="utf-8-sig")
+
+
+def parse_also(pair):
+    """
+    Splits a --also value into an open scoresheet file and an output name.
+    """
+    scoresheet_name, sep, output = pair.partition(os.pathsep)
+    if not sep or not output:
+        raise ValueError(f"--also needs SCORESHEET{os.pathsep}OUTPUT, not {pair!r}")
+    return (open_for_read(scoresheet_name), output)
 
 
 def validate_arguments(arguments):
@@ -60,6 +98,22 @@ def validate_arguments(arguments):
                 error="Dialect must be excel or excel-tab",
             ),
             "--nans-as": str,
+            "--format": And(
+                Use(str.lower),
+                lambda s: s in ("csv",) + arrow_writer.FORMATS,
+                error="Format must be csv, parquet, or feather",
+            ),
+            "--float-places": Use(int, error="--float-places must be a number"),
+            "--also": [
+                Use(parse_also, error="--also needs a scoresheet and an output")
+            ],
+            "--checkpoint": Or(None, str),
+            "--stream": bool,
+            "--columnar": bool,
+            "--jobs": And(Use(int), lambda n: n > 0, error="--jobs must be at least 1"),
+            "--transform-cache": And(
+                Use(int), lambda n: n >= 0, error="--transform-cache can't be negative"
+            ),
             str: object,  # Ignore extras
         }
     )
@@ -68,68 +122,393 @@ def validate_arguments(arguments):
     except SchemaError as e:
         logger.error("Error: " + str(e))
         sys.exit(1)
+    if validated["--stream"] and validated["--columnar"]:
+        logger.error("Error: --stream and --columnar can't be used together")
+        sys.exit(1)
+    if validated["--checkpoint"]:
+        problem = checkpoint_problem(validated)
+        if problem:
+            logger.error(f"Error: --checkpoint {problem}")
+            sys.exit(1)
+    if validated["--stream"] and validated["--also"]:
+        logger.error("Error: --stream and --also can't be used together")
+        sys.exit(1)
+    if is_arrow_file(validated["<datafile>"].name) and not arrow_writer.available():
+        logger.error("Error: reading Parquet and Feather files needs pyarrow")
+        sys.exit(1)
+    if validated["--format"] != "csv" and not arrow_writer.available():
+        logger.error(f"Error: --format={validated['--format']} needs pyarrow")
+        sys.exit(1)
     return validated
 
 
-def read_data(thing, dialect, sheet_number=0):
+def checkpoint_problem(validated):
+    """
+    Why --checkpoint won't work with these arguments, or None if it will.
+    """
+    data_name = validated["<datafile>"].name
+    if validated["--output"] is None:
+        return "needs --output"
+    if validated["--format"] != "csv":
+        return "only works with csv output"
+    if validated["--also"] or validated["--columnar"]:
+        return "can't be used with --also or --columnar"
+    if (
+        data_name.endswith(("xls", "xlsx"))
+        or is_arrow_file(data_name)
+        or compressed_opener(data_name)
+    ):
+        return "only works with uncompressed CSV datafiles"
+    if compressed_opener(validated["--output"]):
+        return "only works with uncompressed output"
+    return None
+
+
+def read_data(thing, dialect, sheet_number=0, columns=None):
     if thing.name.endswith("xls") or thing.name.endswith("xlsx"):
-        wb = openpyxl.load_workbook(thing.name)
-        s = wb[wb.sheetnames[sheet_number]]
-        return ExcelReader(s)
+        return ExcelReader.open(thing.name, sheet_number)
+    elif is_arrow_file(thing.name):
+        # columns are the names in the file, before any renaming
+        return ArrowReader(thing.name, columns)
 
     else:
         return csv.reader(thing, dialect=dialect)
 
 
-def score_data(scoresheet_file, data_file, exclusions, dialect, sheet):
-    # This method is way too long, I know.
+def read_scoresheet(scoresheet_file, dialect):
     scoresheet_data = read_data(scoresheet_file, dialect=dialect)
+    return scoresheet.Reader(scoresheet_data).read_into_scoresheet()
+
 
-    # First, read the scoresheet
-    ss = scoresheet.Reader(scoresheet_data).read_into_scoresheet()
+def check_scoresheet(ss, name):
+    """
+    Logs the errors in ss, if there are any, and exits.
+    """
     if ss.has_errors():
-        logger.error("Errors in {0}:".format(scoresheet_file))
+        logger.error("Errors in {0}:".format(name))
         for err in ss.errors:
             logger.error(err)
         sys.exit(1)
 
-    # Load the data
-    datafile_data = read_data(data_file, dialect=dialect, sheet_number=sheet)
-    df = datafile.Datafile(datafile_data, ss.layout_section, ss.rename_section)
-    df.read()
 
-    # Load and apply exclusions file
-    if exclusions is not None:
-        exclusions_data = read_data(exclusions, dialect=dialect)
-        exc_ss = scoresheet.Reader(exclusions_data).read_into_scoresheet()
-        exc = exc_ss.exclude_section
-        df.apply_exclusions(exc)
+def load_scoresheet(scoresheet_file, dialect):
+    ss = read_scoresheet(scoresheet_file, dialect)
+    check_scoresheet(ss, scoresheet_file)
+    return ss
+
+
+def score_data(
+    scoresheet_file,
+    data_file,
+    exclusions,
+    dialect,
+    sheet,
+    stream=False,
+    columnar=False,
+    jobs=1,
+    transform_cache=0,
+):
+    ss = load_scoresheet(scoresheet_file, dialect)
+    return score_datafile(
+        ss,
+        data_file,
+        exclusions,
+        dialect,
+        sheet,
+        stream,
+        columnar,
+        jobs,
+        transform_cache,
+    )
+
+
+def score_datafile(
+    ss,
+    data_file,
+    exclusions,
+    dialect,
+    sheet,
+    stream=False,
+    columnar=False,
+    jobs=1,
+    transform_cache=0,
+):
+    """
+    Scores data_file with the already-loaded scoresheet ss.
+    """
+    exc_ss = read_exclusions(exclusions, dialect)
+    df = load_datafile([ss], data_file, exc_ss, dialect, sheet, stream, columnar)
+    return score_loaded(ss, df, exc_ss, jobs, transform_cache)
+
+
+def load_shared_datafile(
+    scoresheets, data_file, exclusions, dialect, sheet, columnar=False
+):
+    """
+    Reads data_file once, for all of scoresheets to score with
+    score_shared(). The scoresheets must all read datafiles the same way;
+    see Scoresheet.reads_like(). Returns the Datafile and the exclusions
+    scoresheet.
+    """
+    first = scoresheets[0]
+    for ss in scoresheets[1:]:
+        if not ss.reads_like(first):
+            raise IncompatibleScoresheetsError(
+                "Scoresheets need the same layout and renames to share a datafile"
+            )
+    exc_ss = read_exclusions(exclusions, dialect)
+    df = load_datafile(scoresheets, data_file, exc_ss, dialect, sheet, False, columnar)
+    return df, exc_ss
+
+
+def score_shared(ss, df, exc_ss, jobs=1, transform_cache=0):
+    """
+    Scores df, from load_shared_datafile(), with ss.
+    """
+    # Each scoresheet applies its exclusions to its own shallow copy; that
+    # replaces the copy's rows without touching the ones we read
+    return score_loaded(ss, copy.copy(df), exc_ss, jobs, transform_cache)
+
+
+def read_exclusions(exclusions, dialect):
+    if exclusions is None:
+        return None
+    exclusions_data = read_data(exclusions, dialect=dialect)
+    return scoresheet.Reader(exclusions_data).read_into_scoresheet()
+
+
+def load_datafile(
+    scoresheets, data_file, exc_ss, dialect, sheet, stream=False, columnar=False
+):
+    """
+    Reads data_file (or starts streaming it), keeping only the columns
+    scoresheets and the exclusions scoresheet exc_ss use. The layout and
+    renames come from the first scoresheet.
+    """
+    use_columns = use_columns_for(scoresheets, exc_ss)
+    datafile_data = read_data(
+        data_file,
+        dialect=dialect,
+        sheet_number=sheet,
+        columns=scoresheets[0].rename_section.original_names(use_columns),
+    )
+    return make_datafile(scoresheets[0], datafile_data, use_columns, stream, columnar)
+
+
+def use_columns_for(scoresheets, exc_ss):
+    use_columns = set()
+    for ss in scoresheets:
+        use_columns.update(ss.referenced_columns())
+    if exc_ss is not None:
+        use_columns.update(exc_ss.referenced_columns())
+    return use_columns
+
+
+def make_datafile(ss, lines, use_columns, stream=False, columnar=False):
+    if stream and columnar:
+        raise ValueError("Datafiles can't be both streamed and columnar")
+    datafile_class = datafile.ColumnarDatafile if columnar else datafile.Datafile
+    df = datafile_class(lines, ss.layout_section, ss.rename_section, use_columns)
+    if stream:
+        df.stream()
+    else:
+        df.read()
+    return df
+
+
+def score_loaded(ss, df, exc_ss, jobs=1, transform_cache=0):
+    """
+    Applies ss's exclusions (and exc_ss's) to df, and scores it.
+    """
+    # Apply exclusions from the scoresheet and exclusions file in one pass
+    exclusion_list = list(ss.exclude_section)
+    if exc_ss is not None:
+        exclusion_list.extend(exc_ss.exclude_section)
+    df.apply_exclusions(exclusion_list)
+    if transform_cache > 0:
+        ss.transform_section.enable_cache(transform_cache)
 
-    # Apply exclusions from scoresheet
-    df.apply_exclusions(ss.exclude_section)
     # Actual scoring!
+    if jobs > 1:
+        # Each worker has its own caches, so we can't report on them here
+        plan = scorer.Scorer.compile(ss.transform_section, ss.score_section)
+        return scorer.Scorer.score_parallel(df, plan, ss.aggregator_section, jobs)
     scored = scorer.Scorer.score(df, ss.transform_section, ss.score_section)
     scorer.Scorer.add_measures(scored, ss.aggregator_section)
+    if transform_cache > 0:
+        if scored.streaming:
+            # Streamed rows are only scored as they're written, so wait
+            scored.data = then_call(scored.data, log_cache_stats, ss.transform_section)
+        else:
+            log_cache_stats(ss.transform_section)
     return scored
 
 
-def print_data(scored_data, output, nans_as, dialect, header_map=None):
+def score_with_checkpoint(
+    ss,
+    scoresheet_file,
+    data_file,
+    exclusions,
+    checkpoint_file,
+    output,
+    options,
+    write,
+    jobs=1,
+    transform_cache=0,
+):
+    """
+    Scores data_file (a CSV file) with ss, picking up from the checkpoint in
+    checkpoint_file if it still applies, so only new rows are scored. options
+    are anything else that changes the output, like nans_as; if they're
+    different from last time, everything's scored again.
+
+    write(scored, append) writes streaming ScoredData to output, appending
+    to it if append is set. A last record with no newline yet is scored and
+    written on its own, after everything else, so the checkpoint can leave
+    it out; next time its rows are cut off output and it's scored again.
+    """
+    settings = {
+        "scorify_version": scorify.__version__,
+        "datafile": os.path.abspath(data_file.name),
+        "scoresheet": file_digest(scoresheet_file.name),
+        "exclusions": file_digest(exclusions.name) if exclusions else None,
+        "output": os.path.abspath(output),
+        "options": options,
+    }
+    dialect = options["dialect"]
+    exc_ss = read_exclusions(exclusions, dialect)
+    use_columns = use_columns_for([ss], exc_ss)
+    head_count = make_datafile(ss, [], use_columns).data_start()
+    with open(data_file.name, "rb") as binary_file:
+
+        def read_head():
+            head_lines = checkpoint.OffsetLines(binary_file, 0)
+            return list(itertools.islice(head_lines.records(dialect), head_count))
+
+        saved = checkpoint.Checkpoint.load(checkpoint_file)
+        digest = None
+        if saved is not None:
+            digest = saved.resume_digest(binary_file, settings, output)
+            if digest is None:
+                logger.info(f"Can't use {checkpoint_file}; scoring everything")
+        if digest is None:
+            new = checkpoint.Checkpoint(settings)
+            digest = hashlib.sha256()
+            head = []
+            lines = checkpoint.OffsetLines(binary_file, 0, digest)
+            records = lines.records(dialect, keep=head_count)
+            append = False
+        else:
+            new = checkpoint.Checkpoint(settings, saved.offset, saved.records)
+            saved.rewind_output(output)
+            # We still need the header from the top of the file, but it's
+            # already been hashed
+            head = read_head()
+            lines = checkpoint.OffsetLines(binary_file, saved.offset, digest)
+            records = lines.records(dialect)
+            append = True
+            logger.info(f"Scoring {data_file.name} from record {saved.records}")
+        df = make_datafile(
+            ss, itertools.chain(head, new.counted(records)), use_columns, stream=True
+        )
+        write(score_loaded(ss, df, exc_ss, jobs, transform_cache), append)
+
+        new.offset = lines.offset
+        new.prefix_digest = digest.hexdigest()
+        new.output_size = os.path.getsize(output)
+        if lines.tail is not None:
+            logger.info(
+                f"The last record in {data_file.name} doesn't end with a newline "
+                "yet; it'll be scored again next time"
+            )
+            df = make_datafile(ss, read_head() + [lines.tail], use_columns, stream=True)
+            write(score_loaded(ss, df, exc_ss, 1, transform_cache), True)
+        elif not lines.complete:
+            # The unfinished record is in the header; start over next time
+            new.prefix_digest = None
+        new.written_size = os.path.getsize(output)
+    new.save(checkpoint_file)
+
+
+def then_call(rows, fx, *args):
+    yield from rows
+    fx(*args)
+
+
+def log_cache_stats(transform_section):
+    for t in transform_section:
+        if t.cache is not None:
+            logger.debug(
+                f"Transform {t.name}: {t.cache.hits} cache hits, "
+                f"{t.cache.misses} misses"
+            )
+
+
+def print_data(
+    scored_data,
+    output,
+    nans_as,
+    dialect,
+    header_map=None,
+    float_places=2,
+    file_format="csv",
+    append=False,
+):
+    """
+    Writes scored_data to output, or STDOUT if output is None. If append is
+    set, the rows are added to the end of output, without the header or any
+    keep rows; that only works for CSV files.
+    """
+    logger.info(f"{'Appending' if append else 'Writing'} to {output}")
+    if file_format != "csv":
+        if output is None:
+            output = sys.stdout.buffer
+        arrow_writer.write_scored_data(scored_data, output, file_format, header_map)
+        return
     if output is None:
-        out = csv.writer(sys.stdout, dialect=dialect)
+        write_data(scored_data, sys.stdout, nans_as, dialect, header_map, float_places)
     else:
-        outfile = open(output, "w")
-        out = csv.writer(outfile, dialect=dialect)
+        mode = "a" if append else "w"
+        with open_by_extension(output, mode, buffering=OUTPUT_BUFFER_SIZE) as outfile:
+            write_data(
+                scored_data,
+                outfile,
+                nans_as,
+                dialect,
+                header_map,
+                float_places,
+                not append,
+            )
+
+
+def write_data(
+    scored_data, outfile, nans_as, dialect, header_map, float_places, header=True
+):
+    out = csv.writer(outfile, dialect=dialect)
+    if header:
+        headers_mapped = [h.format_map(header_map) for h in scored_data.header]
+        logger.debug(f"Mapped headers to {headers_mapped}")
+        out.writerow(headers_mapped)
+        for row in scored_data.keep:
+            rk = [row.get(h, "") for h in scored_data.header]
+            out.writerow(rk)
 
-    headers_mapped = [h.format_map(header_map) for h in scored_data.header]
-    logger.debug(f"Mapped headers to {headers_mapped}")
-    logger.info(f"Writing to {output}")
-    out.writerow(headers_mapped)
-    for row in scored_data.keep:
-        rk = [row.get(h, "") for h in scored_data.header]
-        out.writerow(rk)
-    for row in scored_data:
-        rl = [pp(row[h], none_val=nans_as) for h in scored_data.header]
-        out.writerow(rl)
+    # Work out how to get and format each row once, up front
+    row_values = row_getter(scored_data.header)
+    fast_pp = make_pp(float_places, none_val=nans_as)
+    out.writerows([fast_pp(v) for v in row_values(row)] for row in scored_data)
+
+
+def row_getter(header):
+    """
+    A function that gets a row's values, in header order, as a tuple.
+    """
+    if len(header) == 0:
+        return lambda row: ()
+    if len(header) == 1:
+        name = header[0]
+        return lambda row: (row[name],)
+    return operator.itemgetter(*header)
 
 
 def main(argv):
@@ -141,33 +520,118 @@ def main(argv):
         logger.setLevel(logging.WARNING)
     logger.debug(val)
 
+    # Which scoresheet any scoring errors come from
+    current_scoresheet = val["<scoresheet>"]
     try:
-        scored = score_data(
-            val["<scoresheet>"],
-            val["<datafile>"],
-            val["--exclusions"],
-            val["--dialect"],
-            val["--sheet"],
-        )
+        if val["--checkpoint"]:
+            ss = load_scoresheet(val["<scoresheet>"], val["--dialect"])
+            options = {
+                "dialect": val["--dialect"],
+                "nans_as": val["--nans-as"],
+                "float_places": val["--float-places"],
+            }
+
+            def write(scored, append):
+                print_data(
+                    scored,
+                    val["--output"],
+                    val["--nans-as"],
+                    val["--dialect"],
+                    float_places=val["--float-places"],
+                    append=append,
+                )
+
+            score_with_checkpoint(
+                ss,
+                val["<scoresheet>"],
+                val["<datafile>"],
+                val["--exclusions"],
+                val["--checkpoint"],
+                val["--output"],
+                options,
+                write,
+                val["--jobs"],
+                val["--transform-cache"],
+            )
+            return
+        if val["--also"]:
+            scoresheet_files = [val["<scoresheet>"]]
+            outputs = [val["--output"]]
+            for scoresheet_file, output in val["--also"]:
+                scoresheet_files.append(scoresheet_file)
+                outputs.append(output)
+            scoresheets = [
+                load_scoresheet(f, val["--dialect"]) for f in scoresheet_files
+            ]
+            df, exc_ss = load_shared_datafile(
+                scoresheets,
+                val["<datafile>"],
+                val["--exclusions"],
+                val["--dialect"],
+                val["--sheet"],
+                val["--columnar"],
+            )
+            all_scored = []
+            for scoresheet_file, ss in zip(scoresheet_files, scoresheets):
+                current_scoresheet = scoresheet_file
+                all_scored.append(
+                    score_shared(
+                        ss, df, exc_ss, val["--jobs"], val["--transform-cache"]
+                    )
+                )
+        else:
+            scoresheet_files = [val["<scoresheet>"]]
+            outputs = [val["--output"]]
+            all_scored = [
+                score_data(
+                    val["<scoresheet>"],
+                    val["<datafile>"],
+                    val["--exclusions"],
+                    val["--dialect"],
+                    val["--sheet"],
+                    val["--stream"],
+                    val["--columnar"],
+                    val["--jobs"],
+                    val["--transform-cache"],
+                )
+            ]
+        for scoresheet_file, scored, output in zip(
+            scoresheet_files, all_scored, outputs
+        ):
+            current_scoresheet = scoresheet_file
+            # When streaming, scoring happens as we print, so errors show up here
+            print_data(
+                scored,
+                output,
+                val["--nans-as"],
+                val["--dialect"],
+                float_places=val["--float-places"],
+                file_format=val["--format"],
+            )
     except datafile.ExclusionError as err:
         logger.critical("Error in exclusions")
         logger.critical(err)
         sys.exit(1)
     except (scorer.ScoringError, scorer.TransformError) as err:
-        logger.critical("Error in score of {0}:".format(val["<scoresheet>"]))
+        logger.critical("Error in score of {0}:".format(current_scoresheet.name))
         logger.critical(err)
         sys.exit(1)
-    except scorer.AggregationError as err:
-        logger.critical("Error in measures of {0}:".format(val["<scoresheet>"]))
+    except (scorer.AggregationError, scorer.CircularMeasureError) as err:
+        logger.critical("Error in measures of {0}:".format(current_scoresheet.name))
+        logger.critical(err)
+        sys.exit(1)
+    except IncompatibleScoresheetsError as err:
         logger.critical(err)
         sys.exit(1)
-
-    print_data(scored, val["--output"], val["--nans-as"], val["--dialect"])
 
 
 def entry_point():
     main(sys.argv[1:])
 
 
+class IncompatibleScoresheetsError(ValueError):
+    pass
+
+
 if __name__ == "__main__":
     entry_point()
@@ -5,7 +5,7 @@
 
 """Score multiple data files at once.
 
-score_multi takes a spreadsheet that lists data files and scoresheets and 
+score_multi takes a spreadsheet that lists data files and scoresheets and
 scores all of them at once. The input is a CSV file with one row per scoring
 command, and literally whatever columns you want -- as long as the column
 headers don't contain spaces.
@@ -29,10 +29,19 @@ Options:
     -h --help             Show this screen
     --version             Show version
     --dry-run             Don't actually write any output
+    --incremental         Skip rows whose output is up to date: their
+                          scoresheet, data, and options haven't changed
+                          since the output was written. Each output gets a
+                          OUTPUT.scorify.json file to keep track of this.
     --sheet=<num>         If using an Excel datafile as input, what sheet
                           should we use? Indexed from 0. [default: 0]
     --no-format-headers   Don't do string replacement in output headers
     --nans-as=<string>    Print NaNs as this [default: NaN]
+    --float-places=<n>    Round numbers to this many decimal places [default: 2]
+    --format=<fmt>        The output format; options are 'csv', 'parquet', or
+                          'feather' [default: csv]
+    --jobs=<n>            Score this many rows at once, each in its own
+                          process [default: 1]
     -q --quiet            Only print errors
     -v, --verbose         Print extra debugging output
 """
@@ -42,11 +51,18 @@ import scorify
 from scorify.scripts import score_data
 
 from docopt import docopt
-from schema import Schema, Use, SchemaError
+from schema import Schema, Use, And, SchemaError
+from scorify import arrow_writer
+from scorify.scorer import map_in_pool
+from scorify.utils import open_by_extension, file_digest
 
+from collections import namedtuple, OrderedDict
 from csv import DictReader
 from pathlib import Path
+import contextlib
+import json
 import sys
+import time
 
 import logging
 
@@ -56,7 +72,7 @@ logger.setLevel(logging.INFO)
 
 
 def open_for_read(fname):
-    return Path(fname).expanduser().open("r", encoding="utf-8-sig")
+    return open_by_extension(fname, "r", encoding="utf-8-sig")
 
 
 def validate_arguments(args):
@@ -68,7 +84,15 @@ def validate_arguments(args):
             "<output>": str,
             "--sheet": str,
             "--nans-as": str,
+            "--float-places": Use(int, error="--float-places must be a number"),
+            "--format": And(
+                Use(str.lower),
+                lambda s: s in ("csv",) + arrow_writer.FORMATS,
+                error="Format must be csv, parquet, or feather",
+            ),
+            "--jobs": And(Use(int), lambda n: n > 0, error="--jobs must be at least 1"),
             "--dry-run": bool,
+            "--incremental": bool,
             "--no-format-headers": bool,
             "--quiet": bool,
             "--verbose": bool,
@@ -81,6 +105,9 @@ def validate_arguments(args):
         logger.error(f"Error: {e}")
         sys.exit(1)
     validated["--format-headers"] = not validated["--no-format-headers"]
+    if validated["--format"] != "csv" and not arrow_writer.available():
+        logger.error(f"Error: --format={validated['--format']} needs pyarrow")
+        sys.exit(1)
     return validated
 
 
@@ -100,42 +127,436 @@ def format_int_or_none(value, row):
     return int(value.format_map(row)) if value else None
 
 
-def score_single(scoresheet_filename, data_filename, sheet_num):
-    with open(scoresheet_filename, "r", encoding="utf-8-sig") as scoresheet_file:
-        with open(data_filename, "r", encoding="utf-8-sig") as data_file:
-            return score_data.score_data(
-                scoresheet_file, data_file, None, "excel", sheet_num
-            )
+def file_key(filename):
+    """
+    Identifies a file's current contents, as far as the caches here are
+    concerned: its resolved path, modification time, and size.
+    """
+    path = Path(filename).expanduser().resolve()
+    stat = path.stat()
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+class ScoresheetCache(object):
+    """
+    Parsed scoresheets, keyed by resolved path, modification time, and size,
+    so a scoresheet that many rows use is only parsed once per run -- unless
+    it changes in the meantime. Scoresheets with errors are cached too; it's
+    up to whoever uses them to check.
+    """
+
+    def __init__(self):
+        self.scoresheets = {}
+
+    def get(self, filename):
+        key = file_key(filename)
+        ss = self.scoresheets.get(key)
+        if ss is None:
+            logger.debug(f"Parsing {filename}")
+            with open_for_read(filename) as scoresheet_file:
+                ss = score_data.read_scoresheet(scoresheet_file, "excel")
+            self.scoresheets[key] = ss
+        return ss
+
+    def __len__(self):
+        return len(self.scoresheets)
 
 
-def format_and_print(scored_data, output_filename, format_headers, row, nans_as):
+class DigestCache(object):
+    """
+    Hashes of files, keyed like ScoresheetCache, so a datafile or
+    scoresheet that many rows use is only read and hashed once per run.
+    """
+
+    def __init__(self):
+        self.digests = {}
+
+    def get(self, filename):
+        key = file_key(filename)
+        digest = self.digests.get(key)
+        if digest is None:
+            digest = file_digest(filename)
+            self.digests[key] = digest
+        return digest
+
+    def __len__(self):
+        return len(self.digests)
+
+
+def format_and_print(
+    scored_data,
+    output_filename,
+    format_headers,
+    row,
+    nans_as,
+    float_places=2,
+    file_format="csv",
+):
     header_formatter = row if format_headers else None
     score_data.print_data(
-        scored_data, output_filename, nans_as, "excel", header_formatter
+        scored_data,
+        output_filename,
+        nans_as,
+        "excel",
+        header_formatter,
+        float_places,
+        file_format,
     )
 
 
-def score_multi(
-    multi_csv, scoresheet, data, output, sheet, dry_run, format_headers, nans_as
-):
-    csv_reader = DictReader(multi_csv)
-    for row in csv_reader:
-        logger.debug(f"Processing row: {row}")
-        scoresheet_filename = Path(scoresheet.format_map(row)).expanduser()
-        data_filename = Path(data.format_map(row)).expanduser()
-        output_filename = Path(output.format_map(row)).expanduser()
-        sheet_num = format_int_or_none(sheet, row)
-
-        logger.info(f"Scoring {data_filename} with {scoresheet_filename}")
+JobSettings = namedtuple(
+    "JobSettings",
+    [
+        "scoresheet",
+        "data",
+        "output",
+        "sheet",
+        "dry_run",
+        "incremental",
+        "format_headers",
+        "nans_as",
+        "float_places",
+        "file_format",
+        "log_level",
+    ],
+)
+
+JobResult = namedtuple(
+    "JobResult",
+    [
+        "number",
+        "data_filename",
+        "scoresheet_filename",
+        "ok",
+        "skipped",
+        "records",
+        "seconds",
+    ],
+)
+
+
+class RecordCollector(logging.Handler):
+    """
+    Keeps log records instead of printing them, so a job's messages can be
+    printed together, in order, once it's finished.
+    """
+
+    def __init__(self):
+        super(RecordCollector, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        # Format the message now, so records can be sent between processes
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+class RowJob(object):
+    """
+    One row of the multi CSV, as it's scored: its files, its scoresheet, its
+    log records, and how long it took.
+    """
+
+    def __init__(self, number, row):
+        self.number = number
+        self.row = row
+        self.scoresheet_filename = None
+        self.data_filename = None
+        self.output_filename = None
+        self.sheet_num = None
+        self.ss = None
+        self.ok = True
+        self.skipped = False
+        self.inputs = None
+        self.records = []
+        self.seconds = 0.0
+
+    @contextlib.contextmanager
+    def working(self):
+        """
+        Collects this row's log records and time. Any error fails the row,
+        and goes no further.
+        """
+        collector = RecordCollector()
+        logger.addHandler(collector)
+        logger.propagate = False
+        started = time.perf_counter()
+        try:
+            yield
+        except (Exception, SystemExit) as e:
+            # score_data exits on scoresheet errors, but that's just this row
+            logger.error(f"Error scoring {self.data_filename}: {e}")
+            self.ok = False
+        finally:
+            logger.removeHandler(collector)
+            logger.propagate = True
+            self.records.extend(collector.records)
+            self.seconds += time.perf_counter() - started
+
+    def prepare(self, settings, scoresheets):
+        logger.debug(f"Processing row: {self.row}")
+        row = self.row
+        self.scoresheet_filename = Path(
+            settings.scoresheet.format_map(row)
+        ).expanduser()
+        self.data_filename = Path(settings.data.format_map(row)).expanduser()
+        self.output_filename = Path(settings.output.format_map(row)).expanduser()
+        self.sheet_num = format_int_or_none(settings.sheet, row)
+        logger.info(f"Scoring {self.data_filename} with {self.scoresheet_filename}")
+        self.ss = scoresheets.get(self.scoresheet_filename)
+        score_data.check_scoresheet(self.ss, self.scoresheet_filename)
+
+    def sidecar_filename(self):
+        return Path(f"{self.output_filename}.scorify.json")
+
+    def describe_inputs(self, settings, digests):
+        """
+        Everything that goes into this row's output: hashes of its
+        scoresheet and datafile (from digests, a DigestCache), the scorify
+        version, and the options.
+        """
+        return {
+            "scorify_version": scorify.__version__,
+            "scoresheet": digests.get(self.scoresheet_filename),
+            "datafile": digests.get(self.data_filename),
+            "sheet": self.sheet_num,
+            "nans_as": settings.nans_as,
+            "float_places": settings.float_places,
+            "format": settings.file_format,
+            "header_map": self.row if settings.format_headers else None,
+        }
+
+    def check_up_to_date(self, settings, digests):
+        self.inputs = self.describe_inputs(settings, digests)
+        if not self.output_filename.exists():
+            return
+        try:
+            with self.sidecar_filename().open() as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return
+        if recorded == self.inputs:
+            logger.info(f"{self.output_filename} is up to date")
+            self.skipped = True
+
+    def write(self, scored, settings):
+        if settings.dry_run:
+            logger.info(f"--dry-run: would have written to {self.output_filename}")
+            return
+        format_and_print(
+            scored,
+            self.output_filename,
+            settings.format_headers,
+            self.row,
+            settings.nans_as,
+            settings.float_places,
+            settings.file_format,
+        )
+        if self.inputs is not None:
+            with self.sidecar_filename().open("w") as f:
+                json.dump(self.inputs, f, indent=2)
+
+    def result(self):
+        return JobResult(
+            self.number,
+            self.data_filename,
+            self.scoresheet_filename,
+            self.ok,
+            self.skipped,
+            self.records,
+            self.seconds,
+        )
+
+
+def run_group(group, settings, scoresheets, digests):
+    """
+    Scores and writes rows of the multi CSV that use the same datafile,
+    reading it just once for all of them (or once per layout, if their
+    scoresheets read it differently). Scoresheets come from scoresheets, a
+    ScoresheetCache, and --incremental's hashes from digests, a DigestCache.
+    An error reading the datafile fails all the rows that share it; any
+    other error just fails its own row. Returns a
+    JobResult for each row, with its log records.
+    """
+    row_jobs = [RowJob(number, row) for number, row in group]
+    for job in row_jobs:
+        with job.working():
+            job.prepare(settings, scoresheets)
+            if settings.incremental:
+                job.check_up_to_date(settings, digests)
+    to_score = [job for job in row_jobs if job.ok and not job.skipped]
+    for batch in compatible_batches(to_score):
+        # Reading and scoring are shared, and so is their time and logging
+        shared = RowJob(None, None)
+        shared.data_filename = batch[0].data_filename
+        with shared.working():
+            with open_for_read(shared.data_filename) as data_file:
+                df, exc_ss = score_data.load_shared_datafile(
+                    [job.ss for job in batch],
+                    data_file,
+                    None,
+                    "excel",
+                    batch[0].sheet_num,
+                )
+        for job in batch:
+            job.records.extend(shared.records)
+            job.seconds += shared.seconds
+            if not shared.ok:
+                job.ok = False
+                continue
+            # Scoring errors are the row's own, though
+            with job.working():
+                job.write(score_data.score_shared(job.ss, df, exc_ss), settings)
+    return [job.result() for job in row_jobs]
+
+
+def compatible_batches(row_jobs):
+    """
+    Splits row_jobs into lists whose scoresheets all read datafiles the
+    same way, keeping them in order.
+    """
+    batches = []
+    for job in row_jobs:
+        for batch in batches:
+            if job.ss.reads_like(batch[0].ss):
+                batch.append(job)
+                break
+        else:
+            batches.append([job])
+    return batches
+
+
+def group_rows(rows, settings):
+    """
+    Groups (number, row) pairs by the datafile (and sheet) they score, in
+    the order each datafile first shows up.
+    """
+    groups = OrderedDict()
+    for number, row in rows:
+        try:
+            key = (
+                settings.data.format_map(row),
+                format_str_or_none(settings.sheet, row),
+            )
+        except Exception:
+            # This row will fail on its own, when it's run
+            key = number
+        groups.setdefault(key, []).append((number, row))
+    return list(groups.values())
+
+
+# Settings, scoresheets, and file hashes for worker processes; see
+# score_multi()
+worker_settings = None
+worker_scoresheets = None
+worker_digests = None
+
+
+def init_job_worker(settings, scoresheets):
+    global worker_settings, worker_scoresheets, worker_digests
+    worker_settings = settings
+    worker_scoresheets = scoresheets
+    worker_digests = DigestCache()
+    logger.setLevel(settings.log_level)
+    score_data.logger = logger
+
+
+def run_worker_group(group):
+    return run_group(group, worker_settings, worker_scoresheets, worker_digests)
+
+
+def preload_scoresheets(rows, template, scoresheets):
+    """
+    Parses the scoresheet for each row into scoresheets, so worker processes
+    start out with all of them. Rows whose scoresheets can't be read are
+    skipped here; they'll fail, and report why, when they're run.
+    """
+    for _number, row in rows:
         try:
-            scored = score_single(scoresheet_filename, data_filename, sheet_num)
-        except Exception as e:
-            logger.error(f"Error scoring {data_filename}: {e}")
+            scoresheets.get(Path(template.format_map(row)).expanduser())
+        except Exception:
             continue
-        if dry_run:
-            logger.info(f"--dry-run: would have written to {output_filename}")
+
+
+def score_multi(
+    multi_csv,
+    scoresheet,
+    data,
+    output,
+    sheet,
+    dry_run,
+    format_headers,
+    nans_as,
+    float_places=2,
+    file_format="csv",
+    jobs=1,
+    incremental=False,
+):
+    """
+    Scores each row of multi_csv, in a pool of jobs processes if jobs > 1.
+    Rows that use the same datafile are scored together, so it's only read
+    once. Each scoresheet is only parsed once, and workers get them all when
+    they start. Each row's log messages are printed together, in the order
+    of the datafiles and then the rows, followed by a summary. Returns a
+    list of JobResults, in row order.
+    """
+    settings = JobSettings(
+        scoresheet,
+        data,
+        output,
+        sheet,
+        dry_run,
+        incremental,
+        format_headers,
+        nans_as,
+        float_places,
+        file_format,
+        logger.level,
+    )
+    started = time.perf_counter()
+    scoresheets = ScoresheetCache()
+    digests = DigestCache()
+    rows = list(enumerate(DictReader(multi_csv), 1))
+    groups = group_rows(rows, settings)
+    if jobs > 1:
+        preload_scoresheets(rows, scoresheet, scoresheets)
+        results = map_in_pool(
+            run_worker_group, groups, jobs, init_job_worker, (settings, scoresheets)
+        )
+    else:
+        results = (run_group(group, settings, scoresheets, digests) for group in groups)
+    finished = []
+    for group_results in results:
+        for result in group_results:
+            for record in result.records:
+                logger.handle(record)
+            finished.append(result)
+    finished.sort(key=lambda result: result.number)
+    log_summary(finished, time.perf_counter() - started)
+    return finished
+
+
+def log_summary(results, seconds):
+    failures = [r for r in results if not r.ok]
+    skipped = [r for r in results if r.skipped]
+    scored_count = len(results) - len(failures) - len(skipped)
+    logger.info(
+        f"Scored {scored_count} of {len(results)} rows "
+        f"({len(failures)} failed, {len(skipped)} up to date) in {seconds:.2f}s"
+    )
+    for r in results:
+        if not r.ok:
+            status = "FAILED"
+        elif r.skipped:
+            status = "up to date"
         else:
-            format_and_print(scored, output_filename, format_headers, row, nans_as)
+            status = "ok"
+        logger.info(
+            f"  Row {r.number}: {r.data_filename} with {r.scoresheet_filename}: "
+            f"{status} in {r.seconds:.2f}s"
+        )
 
 
 def main(argv):
@@ -157,6 +578,10 @@ def main(argv):
         val["--dry-run"],
         val["--format-headers"],
         val["--nans-as"],
+        val["--float-places"],
+        val["--format"],
+        val["--jobs"],
+        val["--incremental"],
     )
 
 
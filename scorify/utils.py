@@ -3,9 +3,17 @@
 # Copyright (c) 2024 Board of Regents of the University of Wisconsin System
 from __future__ import absolute_import
 
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import os
 import re
 import math
 
+import numpy as np
+
 float_stripper = re.compile(r"\.0*$")
 
 
@@ -25,3 +33,172 @@ def float_pp(num, float_places=2, none_val="NaN"):
         return none_val
     rounded = str(round(num, float_places))
     return float_stripper.sub("", rounded)
+
+
+def make_pp(float_places=2, none_val="NaN"):
+    """
+    Returns a function that formats values exactly like pp() does with these
+    options, but faster; for writing lots of values.
+    """
+    format_float = float_formatter(float_places, none_val)
+
+    def fast_pp(val):
+        val_type = type(val)
+        if val_type is str:
+            return val
+        if val_type is float:
+            return format_float(val)
+        if val is None:
+            return none_val
+        return str(val)
+
+    return fast_pp
+
+
+def float_formatter(float_places=2, none_val="NaN"):
+    """
+    Returns a function that formats floats exactly like float_pp().
+
+    Both round() and "%f" formatting round the exact binary value correctly,
+    so they agree on the digits. When a number has at most 15 significant
+    digits after rounding, str() of the rounded float is just those digits
+    with trailing zeros removed, so we can skip round() and str(). For bigger
+    numbers, tiny ones str() would write in scientific notation, or NaN and
+    infinity, we use float_pp().
+    """
+    if float_places < 0 or float_places > 15:
+        return lambda num: float_pp(num, float_places, none_val)
+    float_format = "%." + str(float_places) + "f"
+    limit = 10.0 ** (15 - float_places)
+    # With 4 or fewer places, anything this small rounds to 0 anyhow
+    tiny = 1e-4 if float_places > 4 else 0.0
+
+    def format_float(num):
+        if -limit < num < limit and not -tiny < num < tiny:
+            formatted = float_format % num
+            if float_places > 0:
+                formatted = formatted.rstrip("0").rstrip(".")
+            return formatted
+        return float_pp(num, float_places, none_val)
+
+    return format_float
+
+
+def factorize(values):
+    """
+    Splits values into a list of distinct values (levels) and an array of
+    codes, where values[i] == levels[codes[i]]. Survey data usually has only
+    a few distinct values per column, so this lets us do expensive work on
+    each distinct value just once.
+
+    Columns from a ColumnarDatafile are already stored this way, so we just
+    use their codes and levels directly.
+    """
+    if hasattr(values, "levels"):
+        return np.frombuffer(values.codes, dtype=np.uint32), values.levels
+    level_codes = {}
+    levels = []
+    codes = np.empty(len(values), dtype=np.intp)
+    for i, value in enumerate(values):
+        code = level_codes.get(value)
+        if code is None:
+            code = len(levels)
+            levels.append(value)
+            level_codes[value] = code
+        codes[i] = code
+    return codes, levels
+
+
+def to_float_array(values):
+    """
+    Converts values to a float64 array, following float()'s rules. Returns
+    the array and a mask of the values float() couldn't convert; those are
+    NaN in the array.
+    """
+    codes, levels = factorize(values)
+    level_floats = np.empty(len(levels), dtype=np.float64)
+    level_invalid = np.zeros(len(levels), dtype=bool)
+    for i, level in enumerate(levels):
+        try:
+            level_floats[i] = float(level)
+        except (TypeError, ValueError):
+            level_floats[i] = np.nan
+            level_invalid[i] = True
+    return level_floats[codes], level_invalid[codes]
+
+
+def to_float_matrix(columns):
+    """
+    Converts a list of columns into a (rows x items) float array, plus a mask
+    of the cells float() couldn't convert, which are NaN in the array.
+    """
+    floats, invalid = zip(*[to_float_array(column) for column in columns])
+    return np.column_stack(floats), np.column_stack(invalid)
+
+
+def coercion_counts(columns, invalid):
+    """
+    For each of columns, how many of its cells to_float_matrix() turned into
+    NaN, as a (blank, not numeric) pair. Blank cells are usually just missing
+    answers; anything else is more likely to be a mistake in the data.
+    """
+    counts = []
+    for column, column_invalid in zip(columns, invalid.T):
+        codes, levels = factorize(column)
+        level_blank = np.array(
+            [level is None or str(level).strip() == "" for level in levels],
+            dtype=bool,
+        )
+        blank = int(np.count_nonzero(level_blank[codes]))
+        counts.append((blank, int(np.count_nonzero(column_invalid)) - blank))
+    return counts
+
+
+def take(levels, codes):
+    """
+    The inverse of factorize(): a list with levels[code] for each code.
+    """
+    level_array = np.empty(len(levels), dtype=object)
+    level_array[:] = levels
+    return level_array[codes].tolist()
+
+
+# Files with these extensions are (de)compressed as they're read or written
+COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def compressed_opener(fname):
+    """
+    The function to open fname with if it's compressed, or None.
+    """
+    _base, extension = os.path.splitext(str(fname))
+    return COMPRESSED_OPENERS.get(extension.lower())
+
+
+def open_by_extension(fname, mode="r", encoding="utf-8", buffering=-1):
+    """
+    Opens a text file, like io.open(). If fname ends in .gz, .bz2, or .xz,
+    it's decompressed as it's read (or compressed as it's written), a block
+    at a time. buffering only applies to files that aren't compressed.
+    Either way, the file's name is fname.
+    """
+    fname = os.path.expanduser(str(fname))
+    opener = compressed_opener(fname)
+    if opener is None:
+        return io.open(fname, mode, buffering=buffering, encoding=encoding)
+    binary = opener(fname, mode + "b")
+    # Before Python 3.13, bz2 and lzma files don't have names
+    if not hasattr(binary, "name"):
+        binary.name = fname
+    return io.TextIOWrapper(binary, encoding=encoding)
+
+
+def file_digest(fname, block_size=1024 * 1024):
+    """
+    The SHA-256 hex digest of fname's contents, read a block at a time.
+    """
+    digest = hashlib.sha256()
+    with open(os.path.expanduser(str(fname)), "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -8,7 +8,7 @@ import pytest
 
 import math
 
-from scorify import aggregators
+from scorify import aggregators, utils
 
 
 def test_good_parsing():
@@ -117,3 +117,45 @@ def test_sum_imputed():
 def test_imputed_fraction():
     ar = [1, None, 3, 5]
     assert aggregators.ag_imputed_fraction(ar) == (1 / 4)
+
+
+def nan_equal(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b))
+    return a == b
+
+
+def check_matrix_version(fx, rows):
+    expected = []
+    for row in rows:
+        try:
+            expected.append(fx(row))
+        except ValueError:
+            expected.append(float("nan"))
+    columns = [list(column) for column in zip(*rows)]
+    values, invalid = utils.to_float_matrix(columns)
+    results = aggregators.matrix_version(fx)(values, invalid).tolist()
+    for e, r in zip(expected, results):
+        assert nan_equal(e, r)
+
+
+def test_matrix_versions_match():
+    rows = [
+        ["1", "2", "3"],
+        ["1", "", "3"],
+        [1.5, 0.1, 0.2],
+        [float("nan"), 2.0, 1.0],
+        [2.0, float("nan"), 1.0],
+        ["bad", "4", "5"],
+        ["", "", " "],
+        [float("inf"), "1", "2"],
+        [1e17, 1.0, -1e17],
+        ["-0.5", "7", "7"],
+    ]
+    for fx in aggregators.matrix_fx_map:
+        check_matrix_version(fx, rows)
+
+
+def test_matrix_version_missing():
+    assert aggregators.matrix_version(aggregators.ag_join) is None
+    assert aggregators.matrix_version(aggregators.ag_ratio) is None
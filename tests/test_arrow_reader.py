@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+import pytest
+
+from scorify import arrow_reader, datafile, scoresheet
+
+pyarrow = pytest.importorskip("pyarrow")
+import pyarrow.feather  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+
+@pytest.fixture
+def table():
+    return pyarrow.table(
+        {
+            "ppt": ["a", "b", None],
+            "happy1": [5, 2, 3],
+            "happy2": [1.0, None, 2.5],
+            "unused": [True, False, True],
+        }
+    )
+
+
+@pytest.fixture
+def parquet_file(tmp_path, table):
+    filename = tmp_path / "data.parquet"
+    pyarrow.parquet.write_table(table, filename, row_group_size=2)
+    return filename
+
+
+@pytest.fixture
+def feather_file(tmp_path, table):
+    filename = tmp_path / "data.feather"
+    pyarrow.feather.write_feather(table, filename, chunksize=2)
+    return filename
+
+
+def test_is_arrow_file():
+    assert arrow_reader.is_arrow_file("foo.parquet")
+    assert arrow_reader.is_arrow_file("FOO.Feather")
+    assert not arrow_reader.is_arrow_file("foo.csv")
+
+
+def test_reads_parquet_as_lines(parquet_file):
+    reader = arrow_reader.ArrowReader(parquet_file)
+    lines = list(reader)
+    assert lines == [
+        ["ppt", "happy1", "happy2", "unused"],
+        ["a", "5", "1", "true"],
+        ["b", "2", "", "false"],
+        ["", "3", "2.5", "true"],
+    ]
+    assert reader.line_num == 4
+
+
+def test_reads_feather_in_batches(feather_file):
+    reader = arrow_reader.ArrowReader(feather_file, batch_rows=1)
+    lines = list(reader)
+    assert len(lines) == 4
+    assert lines[3] == ["", "3", "2.5", "true"]
+
+
+def test_projects_columns(parquet_file, feather_file):
+    for filename in [parquet_file, feather_file]:
+        reader = arrow_reader.ArrowReader(filename, columns=set(["happy2", "ppt"]))
+        lines = list(reader)
+        # Columns stay in file order
+        assert lines[0] == ["ppt", "happy2"]
+        assert lines[1] == ["a", "1"]
+
+
+def test_feeds_datafile(parquet_file):
+    layout = scoresheet.LayoutSection()
+    layout.append_from_strings(["header"])
+    layout.append_from_strings(["data"])
+    renames = scoresheet.RenameSection()
+    renames.append_from_strings(["happy1", "h1"])
+    use_columns = set(["ppt", "h1"])
+    reader = arrow_reader.ArrowReader(
+        parquet_file, columns=renames.original_names(use_columns)
+    )
+    df = datafile.Datafile(reader, layout, renames, use_columns)
+    df.read()
+    assert df.header == ["ppt", "h1"]
+    assert df.data[1] == {"ppt": "b", "h1": "2"}
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+import pytest
+
+import json
+import math
+from scorify import arrow_writer, scorer
+
+pyarrow = pytest.importorskip("pyarrow")
+import pyarrow.feather  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+
+@pytest.fixture
+def scored():
+    sd = scorer.ScoredData(
+        header=["ppt", "happy", "mean_happy", "joined"],
+        keep=[{"ppt": "Participant", "happy": "How happy?"}],
+        numeric_columns=set(["happy", "mean_happy"]),
+    )
+    sd.data = [
+        {"ppt": "a", "happy": 1.0, "mean_happy": 1.5, "joined": "x|y"},
+        {"ppt": "b", "happy": "", "mean_happy": float("nan"), "joined": ""},
+        {"ppt": "c", "happy": 5.0, "mean_happy": 3.0, "joined": "z"},
+    ]
+    return sd
+
+
+def test_writes_typed_parquet(tmp_path, scored):
+    output = tmp_path / "out.parquet"
+    arrow_writer.write_scored_data(scored, str(output), "parquet", chunk_rows=2)
+    pf = pyarrow.parquet.ParquetFile(output)
+    assert pf.metadata.num_row_groups == 2
+    table = pf.read()
+    assert table.column_names == scored.header
+    assert table.schema.field("ppt").type == pyarrow.string()
+    assert table.schema.field("happy").type == pyarrow.float64()
+    assert table.column("ppt").to_pylist() == ["a", "b", "c"]
+    assert table.column("happy").to_pylist() == [1.0, None, 5.0]
+    assert math.isnan(table.column("mean_happy").to_pylist()[1])
+    assert table.column("joined").to_pylist() == ["x|y", "", "z"]
+    keep = json.loads(table.schema.metadata[b"scorify.keep"])
+    assert keep == [["Participant", "How happy?", "", ""]]
+
+
+def test_writes_feather_from_stream(tmp_path, scored):
+    scored.data = iter(scored.data)
+    scored.streaming = True
+    output = tmp_path / "out.feather"
+    arrow_writer.write_scored_data(scored, str(output), "feather", {"x": 1})
+    table = pyarrow.feather.read_table(output)
+    assert table.num_rows == 3
+    assert table.column("mean_happy").to_pylist()[0] == 1.5
+
+
+def test_header_map(tmp_path, scored):
+    scored.header[1] = "happy_{event}"
+    scored.numeric_columns.add("happy_{event}")
+    for row in scored.data:
+        row["happy_{event}"] = row.pop("happy")
+    output = tmp_path / "out.parquet"
+    arrow_writer.write_scored_data(scored, str(output), "parquet", {"event": "t1"})
+    table = pyarrow.parquet.read_table(output)
+    assert table.column_names[1] == "happy_t1"
+    assert table.schema.field("happy_t1").type == pyarrow.float64()
+
+
+def test_unknown_format(scored):
+    with pytest.raises(arrow_writer.ArrowFormatError):
+        arrow_writer.write_scored_data(scored, "nowhere", "xml")
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Part of the scorify package
+# Copyright (c) 2024 Board of Regents of the University of Wisconsin System
+
+import csv
+import hashlib
+
+from scorify import checkpoint
+
+
+def test_offset_lines_track_records(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b'\xef\xbb\xbfa,b\n1,"two\nlines"\n3,4\n')
+    with open(data, "rb") as f:
+        digest = hashlib.sha256()
+        lines = checkpoint.OffsetLines(f, 0, digest)
+        reader = lines.records()
+        assert next(reader) == ["a", "b"]
+        assert lines.offset == 7
+        assert next(reader) == ["1", "two\nlines"]
+        assert lines.offset == 21
+        assert list(reader) == [["3", "4"]]
+    assert digest.hexdigest() == hashlib.sha256(data.read_bytes()).hexdigest()
+
+
+def test_offset_lines_hold_back_unfinished_record(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b'a,b\n1,2\n3,"fo\no')
+    with open(data, "rb") as f:
+        digest = hashlib.sha256()
+        lines = checkpoint.OffsetLines(f, 0, digest)
+        assert list(lines.records()) == [["a", "b"], ["1", "2"]]
+        assert lines.tail == ["3", "fo\no"]
+        assert not lines.complete
+        assert lines.offset == 8
+    assert digest.hexdigest() == hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+
+    # Unless it's one we have to keep
+    data.write_bytes(b"a,b")
+    with open(data, "rb") as f:
+        lines = checkpoint.OffsetLines(f)
+        assert list(lines.records(keep=1)) == [["a", "b"]]
+        assert lines.tail is None
+        assert lines.offset == 0
+
+
+def test_offset_lines_start_anywhere(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b"a,b\n1,2\n3,4\n")
+    with open(data, "rb") as f:
+        assert list(csv.reader(checkpoint.OffsetLines(f, 8))) == [["3", "4"]]
+
+
+def test_checkpoint_saves_and_resumes(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b"a,b\n1,2\n")
+    output = tmp_path / "out.csv"
+    output.write_text("scored")
+    filename = str(tmp_path / "checkpoint.json")
+    settings = {"scoresheet": "abc"}
+    saved = checkpoint.Checkpoint(
+        settings, 8, 2, hashlib.sha256(data.read_bytes()).hexdigest(), 6
+    )
+    saved.save(filename)
+    loaded = checkpoint.Checkpoint.load(filename)
+    assert loaded.__dict__ == saved.__dict__
+
+    data.write_bytes(b"a,b\n1,2\n3,4\n")
+    with open(data, "rb") as f:
+        assert loaded.resume_digest(f, settings, output) is not None
+        assert loaded.resume_digest(f, {"scoresheet": "def"}, output) is None
+    output.write_text("scored more")
+    with open(data, "rb") as f:
+        assert loaded.resume_digest(f, settings, output) is None
+
+
+def test_checkpoint_notices_changes(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b"a,b\n1,2\n")
+    output = tmp_path / "out.csv"
+    output.write_text("scored")
+    digest = hashlib.sha256(data.read_bytes()).hexdigest()
+    saved = checkpoint.Checkpoint({}, 8, 2, digest, 6)
+    data.write_bytes(b"a,b\n1,3\n3,4\n")
+    with open(data, "rb") as f:
+        assert saved.resume_digest(f, {}, output) is None
+    data.write_bytes(b"a,b\n")
+    with open(data, "rb") as f:
+        assert saved.resume_digest(f, {}, output) is None
+
+
+def test_rewind_output(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_bytes(b"a,b\n1,2\n3,4")
+    output = tmp_path / "out.csv"
+    output.write_text("scored\n3,4\n")
+    digest = hashlib.sha256(b"a,b\n1,2\n").hexdigest()
+    saved = checkpoint.Checkpoint({}, 8, 2, digest, 7, 11)
+    with open(data, "rb") as f:
+        assert saved.resume_digest(f, {}, output) is not None
+    saved.rewind_output(output)
+    assert output.read_text() == "scored\n"
+
+
+def test_load_missing_checkpoint(tmp_path):
+    assert checkpoint.Checkpoint.load(str(tmp_path / "nope.json")) is None
+    (tmp_path / "bad.json").write_text("{")
+    assert checkpoint.Checkpoint.load(str(tmp_path / "bad.json")) is None
@@ -178,3 +178,165 @@ def test_apply_exclusions(
     df.apply_exclusions(exclude_section)
     assert len(df) == 2
     assert df[0]["ppt"] == "b"
+
+
+def test_stream_reads_header_and_keep_first(
+    good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+):
+    df = datafile.Datafile(
+        iter(good_data_keep), layout_section_with_skip_and_keep, empty_rename_section
+    )
+    df.stream()
+    assert df.header == good_data_keep[0]
+    assert df.keep[0]["happy1"] == "How happy are you?"
+    rows = list(df)
+    assert len(rows) == 3
+    assert rows[0] == dict(zip(df.header, good_data_keep[3]))
+
+
+def test_stream_applies_exclusions(
+    good_data, layout_section_with_skip, exclude_section, empty_rename_section
+):
+    df = datafile.Datafile(
+        iter(good_data), layout_section_with_skip, empty_rename_section
+    )
+    df.stream()
+    df.apply_exclusions(exclude_section)
+    assert [row["ppt"] for row in df] == ["b", "c"]
+
+
+def test_column_stores_levels_once():
+    col = datafile.Column(["1", "2", "1", "1"])
+    assert col.levels == ["1", "2"]
+    assert list(col.codes) == [0, 1, 0, 0]
+    assert col.values() == ["1", "2", "1", "1"]
+    assert col[1] == "2"
+    assert col.take([3, 1]).values() == ["1", "2"]
+
+
+def test_columnar_read_matches_rows(
+    good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+):
+    df = datafile.Datafile(
+        good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+    )
+    df.read()
+    cdf = datafile.ColumnarDatafile(
+        good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+    )
+    cdf.read()
+    assert cdf.header == df.header
+    assert cdf.keep == df.keep
+    assert len(cdf) == len(df)
+    assert list(cdf) == df.data
+    assert cdf[0] == df[0]
+    assert cdf[-1] == df[-1]
+    assert cdf.column("ppt").values() == ["a", "b", "c"]
+
+
+def test_columnar_cant_stream(
+    good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+):
+    cdf = datafile.ColumnarDatafile(
+        good_data_keep, layout_section_with_skip_and_keep, empty_rename_section
+    )
+    with pytest.raises(ValueError):
+        cdf.stream()
+
+
+def test_columnar_handles_odd_lengths_and_duplicates(
+    data_with_duplicate_header, layout_section_no_skip, empty_rename_section
+):
+    with pytest.warns(UserWarning):
+        df = datafile.ColumnarDatafile(
+            data_with_duplicate_header, layout_section_no_skip, empty_rename_section
+        )
+        df.read()
+    assert df[0] == {"a": 3, "b": 2}
+    df = datafile.ColumnarDatafile(
+        [["a", "b"], [1]], layout_section_no_skip, empty_rename_section
+    )
+    df.read()
+    assert df[0] == {"a": 1, "b": ""}
+
+
+def test_columnar_apply_exclusions(
+    good_data, layout_section_with_skip, exclude_section, empty_rename_section
+):
+    df = datafile.ColumnarDatafile(
+        good_data, layout_section_with_skip, empty_rename_section
+    )
+    df.read()
+    df.apply_exclusions(exclude_section)
+    assert len(df) == 2
+    assert df[0]["ppt"] == "b"
+    assert df.column("ppt").values() == ["b", "c"]
+
+
+def test_use_columns_projects(
+    good_data, layout_section_with_skip, active_rename_section
+):
+    df = datafile.Datafile(
+        good_data,
+        layout_section_with_skip,
+        active_rename_section,
+        use_columns={"ppt", "happy_1", "missing"},
+    )
+    df.read()
+    assert df.header == ["ppt", "happy_1"]
+    assert df.data[0] == {"ppt": "a", "happy_1": "5"}
+    assert "extra" in df.known_columns()
+
+
+def test_columnar_use_columns_projects(
+    data_with_funny_lengths, layout_section_no_skip, empty_rename_section
+):
+    df = datafile.ColumnarDatafile(
+        data_with_funny_lengths,
+        layout_section_no_skip,
+        empty_rename_section,
+        use_columns={"b"},
+    )
+    df.read()
+    assert df.header == ["b"]
+    assert list(df) == [{"b": 2}, {"b": ""}]
+
+
+def test_exclusion_index_groups_values():
+    es = scoresheet.ExcludeSection()
+    es.append_from_strings(["ppt", "a"])
+    es.append_from_strings(["ppt", " c "])
+    es.append_from_strings(["extra", "9"])
+    index = datafile.ExclusionIndex(es)
+    assert index.values_by_column == {"ppt": {"a", "c"}, "extra": {"9"}}
+    rows = [{"ppt": "a ", "extra": "3"}, {"ppt": "b", "extra": "3"}]
+    assert list(index.filter(rows)) == [rows[1]]
+
+
+def test_apply_exclusions_bad_column(
+    good_data, layout_section_with_skip, empty_rename_section
+):
+    es = scoresheet.ExcludeSection()
+    es.append_from_strings(["nope", "a"])
+    for kls in [datafile.Datafile, datafile.ColumnarDatafile]:
+        df = kls(good_data, layout_section_with_skip, empty_rename_section)
+        df.read()
+        with pytest.raises(datafile.ExclusionError):
+            df.apply_exclusions(es)
+
+
+def test_columnar_exclusions_match_rows(
+    good_data, layout_section_with_skip, empty_rename_section
+):
+    es = scoresheet.ExcludeSection()
+    es.append_from_strings(["ppt", "c"])
+    es.append_from_strings(["ppt", "a"])
+    df = datafile.Datafile(good_data, layout_section_with_skip, empty_rename_section)
+    df.read()
+    df.apply_exclusions(es)
+    cdf = datafile.ColumnarDatafile(
+        good_data, layout_section_with_skip, empty_rename_section
+    )
+    cdf.read()
+    cdf.apply_exclusions(es)
+    assert list(cdf) == df.data == [dict(zip(good_data[0], good_data[3]))]
@@ -58,3 +58,26 @@ def test_measure():
     assert m.to_use == ["c_foo"]
     with pytest.raises(directives.DirectiveError):
         directives.Aggregator("foo", "bar")
+
+
+def test_transform_cache():
+    tx = directives.Transform("", "map(1:5,5:1)")
+    tx.enable_cache(2)
+    assert tx.transform("1") == 5
+    assert tx.transform("1") == 5
+    assert (tx.cache.hits, tx.cache.misses) == (1, 1)
+    for i in range(2):
+        with pytest.raises(ValueError):
+            tx.transform("bad")
+    assert (tx.cache.hits, tx.cache.misses) == (2, 2)
+    # "1" is the least recently used, so it's gone now
+    assert tx.transform("2") == 4
+    assert list(tx.cache.entries.keys()) == ["bad", "2"]
+    assert tx.transform(3) == 3
+    assert (tx.cache.hits, tx.cache.misses) == (2, 3)
+
+
+def test_identity_transform_doesnt_cache():
+    tx = directives.Transform("", "")
+    tx.enable_cache(10)
+    assert tx.cache is None
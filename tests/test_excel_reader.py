@@ -0,0 +1,26 @@
+import pytest
+
+from .base import from_subdir
+from scorify.excel_reader import ExcelReader
+
+
+def test_reads_rows_as_strings():
+    reader = ExcelReader.open(from_subdir("input", "003_data.xlsx"))
+    first = next(reader)
+    assert reader.line_num == 1
+    assert all(isinstance(v, str) for v in first)
+    rows = list(reader)
+    assert reader.line_num == len(rows) + 1
+    # The workbook is closed once we've read everything
+    assert reader.workbook is None
+
+
+def test_reads_other_sheets():
+    first_sheet = list(ExcelReader.open(from_subdir("input", "003_data.xlsx")))
+    second_sheet = list(ExcelReader.open(from_subdir("input", "003_data.xlsx"), 1))
+    assert first_sheet != second_sheet
+
+
+def test_bad_sheet_number():
+    with pytest.raises(IndexError):
+        ExcelReader.open(from_subdir("input", "003_data.xlsx"), 10)
@@ -1,14 +1,18 @@
 from __future__ import absolute_import, division
 
 import pytest
+import bz2
 import csv
+import gzip
+import lzma
+import os
 
 from .base import from_subdir
 from scorify.scripts import score_data
 
 
-def run_score_data(scoresheet, data, output, sheet=None):
-    args = [
+def run_score_data(scoresheet, data, output, sheet=None, extra_args=None):
+    args = (extra_args or []) + [
         "--output=" + from_subdir("output", output),
         from_subdir("input", scoresheet),
         from_subdir("input", data),
@@ -18,8 +22,8 @@ def run_score_data(scoresheet, data, output, sheet=None):
     score_data.main(args)
 
 
-def run_test(scoresheet, data, expected):
-    run_score_data(scoresheet, data, expected)
+def run_test(scoresheet, data, expected, extra_args=None):
+    run_score_data(scoresheet, data, expected, extra_args=extra_args)
 
     expected_content = open(from_subdir("input", expected)).read()
     actual_content = open(from_subdir("output", expected)).read()
@@ -74,3 +78,214 @@ def test_excel_integration_error():
 
 def test_score_column_names():
     run_test("005_scoresheet.csv", "005_data.csv", "005_expected.csv")
+
+
+def test_streaming_matches():
+    run_test("001_scoresheet.csv", "001_data.csv", "001_expected.csv", ["--stream"])
+    run_test("005_scoresheet.csv", "005_data.csv", "005_expected.csv", ["--stream"])
+
+
+def test_columnar_matches():
+    run_test("001_scoresheet.csv", "001_data.csv", "001_expected.csv", ["--columnar"])
+    run_test("005_scoresheet.csv", "005_data.csv", "005_expected.csv", ["--columnar"])
+
+
+def test_parallel_matches():
+    run_test("001_scoresheet.csv", "001_data.csv", "001_expected.csv", ["--jobs=2"])
+    run_test(
+        "005_scoresheet.csv",
+        "005_data.csv",
+        "005_expected.csv",
+        ["--jobs=2", "--stream"],
+    )
+
+
+def test_transform_cache_matches():
+    run_test(
+        "001_scoresheet.csv",
+        "001_data.csv",
+        "001_expected.csv",
+        ["--transform-cache=2"],
+    )
+    run_test(
+        "005_scoresheet.csv",
+        "005_data.csv",
+        "005_expected.csv",
+        ["--transform-cache=100", "--stream", "--verbose"],
+    )
+
+
+def test_float_places(tmp_path):
+    output = tmp_path / "out.csv"
+    score_data.main(
+        [
+            "--float-places=4",
+            "--output=" + str(output),
+            from_subdir("input", "001_scoresheet.csv"),
+            from_subdir("input", "001_data.csv"),
+        ]
+    )
+    with open(output) as f:
+        rows = list(csv.reader(f))
+    # foo_mean is 14/3 on the first row
+    assert rows[1][9] == "4.6667"
+
+
+def test_parquet_output(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "out.parquet"
+    score_data.main(
+        [
+            "--format=parquet",
+            "--stream",
+            "--output=" + str(output),
+            from_subdir("input", "001_scoresheet.csv"),
+            from_subdir("input", "001_data.csv"),
+        ]
+    )
+    table = pq.read_table(output)
+    with open(from_subdir("input", "001_expected.csv")) as f:
+        expected = list(csv.reader(f))
+    assert table.column_names == expected[0]
+    assert table.num_rows == len(expected) - 1
+    # foo_mean is 14/3 on the first row, with no rounding
+    assert table.column(9)[0].as_py() == 14.0 / 3.0
+
+
+def test_parquet_input(tmp_path):
+    pa_csv = pytest.importorskip("pyarrow.csv")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa_csv.read_csv(from_subdir("input", "001_data.csv"))
+    data = tmp_path / "001_data.parquet"
+    pq.write_table(table, data)
+    output = tmp_path / "out.csv"
+    score_data.main(
+        [
+            "--output=" + str(output),
+            from_subdir("input", "001_scoresheet.csv"),
+            str(data),
+        ]
+    )
+    expected = open(from_subdir("input", "001_expected.csv")).read()
+    assert output.read_text() == expected
+
+
+def test_compressed_input_and_output(tmp_path):
+    data = tmp_path / "001_data.csv.gz"
+    with open(from_subdir("input", "001_data.csv"), "rb") as f:
+        data.write_bytes(gzip.compress(f.read()))
+    output = tmp_path / "out.csv.xz"
+    score_data.main(
+        [
+            "--output=" + str(output),
+            from_subdir("input", "001_scoresheet.csv"),
+            str(data),
+        ]
+    )
+    expected = open(from_subdir("input", "001_expected.csv")).read()
+    with lzma.open(output, "rt") as f:
+        assert f.read() == expected
+
+
+@pytest.mark.parametrize("extension,compress", [(".xz", lzma), (".bz2", bz2)])
+def test_xz_and_bz2_input(tmp_path, extension, compress):
+    data = tmp_path / ("001_data.csv" + extension)
+    with open(from_subdir("input", "001_data.csv"), "rb") as f:
+        data.write_bytes(compress.compress(f.read()))
+    output = tmp_path / "out.csv"
+    score_data.main(
+        [
+            "--output=" + str(output),
+            from_subdir("input", "001_scoresheet.csv"),
+            str(data),
+        ]
+    )
+    expected = open(from_subdir("input", "001_expected.csv")).read()
+    assert output.read_text() == expected
+
+
+def test_also_scores_with_more_scoresheets(tmp_path):
+    also_output = tmp_path / "also.csv"
+    also = from_subdir("input", "005_scoresheet.csv") + os.pathsep + str(also_output)
+    run_test(
+        "001_scoresheet.csv", "001_data.csv", "001_expected.csv", ["--also=" + also]
+    )
+    expected = open(from_subdir("input", "005_expected.csv")).read()
+    assert also_output.read_text() == expected
+
+
+def test_also_names_the_failing_scoresheet(tmp_path, caplog):
+    broken = tmp_path / "broken_scoresheet.csv"
+    broken.write_text(
+        open(from_subdir("input", "001_scoresheet.csv")).read()
+        + "\nscore,no_such_column\n"
+    )
+    also = str(broken) + os.pathsep + str(tmp_path / "also.csv")
+    with pytest.raises(SystemExit):
+        score_data.main(
+            [
+                "--output=" + str(tmp_path / "out.csv"),
+                "--also=" + also,
+                from_subdir("input", "001_scoresheet.csv"),
+                from_subdir("input", "001_data.csv"),
+            ]
+        )
+    assert f"Error in score of {broken}:" in caplog.text
+
+
+def test_also_cant_stream(tmp_path):
+    also = from_subdir("input", "005_scoresheet.csv") + os.pathsep + "out.csv"
+    with pytest.raises(SystemExit):
+        run_test(
+            "001_scoresheet.csv",
+            "001_data.csv",
+            "001_expected.csv",
+            ["--also=" + also, "--stream"],
+        )
+
+
+def test_checkpoint_appends_new_rows(tmp_path):
+    lines = open(from_subdir("input", "001_data.csv")).readlines()
+    data = tmp_path / "data.csv"
+    output = tmp_path / "out.csv"
+    args = [
+        "--checkpoint=" + str(tmp_path / "checkpoint.json"),
+        "--output=" + str(output),
+        from_subdir("input", "001_scoresheet.csv"),
+        str(data),
+    ]
+    expected = open(from_subdir("input", "001_expected.csv")).read()
+
+    data.write_text("".join(lines[:2]))
+    score_data.main(args)
+    data.write_text("".join(lines))
+    score_data.main(args)
+    assert output.read_text() == expected
+    # Nothing new, so nothing changes
+    score_data.main(args)
+    assert output.read_text() == expected
+
+    # The last line has no newline, so it might not be finished; it's
+    # scored again once it is
+    assert not lines[-1].endswith("\n")
+    data.write_text("".join(lines) + "\n4,1,2,3,4,5,1,2,3\n")
+    score_data.main(args)
+    rescored = tmp_path / "rescored.csv"
+    score_data.main(["--output=" + str(rescored)] + args[2:])
+    assert output.read_text() == rescored.read_text()
+    assert len(output.read_text().splitlines()) == len(lines) + 1
+
+    # If the rows we already scored change, everything's scored again
+    data.write_text("".join(lines[:1] + lines[2:]))
+    score_data.main(args)
+    assert len(output.read_text().splitlines()) == len(lines) - 1
+
+
+def test_checkpoint_needs_csv_output():
+    with pytest.raises(SystemExit):
+        run_test(
+            "001_scoresheet.csv",
+            "001_data.csv",
+            "001_expected.csv",
+            ["--checkpoint=checkpoint.json", "--format=parquet"],
+        )
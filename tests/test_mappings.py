@@ -4,6 +4,8 @@
 
 from __future__ import with_statement
 
+import math
+
 import pytest
 
 from scorify.mappings import (
@@ -92,3 +94,27 @@ def test_mapping_types():
     assert type(Mapping.from_string('discrete_map("a":"b")')) == DiscreteMapping
 
     assert type(Mapping.from_string('passthrough_map("a":"b")')) == PassthroughMapping
+
+
+def test_linear_transform_many_matches_transform():
+    m = LinearMapping((1, 7), (0.3, -2.9))
+    values = ["1", "2", "3.3", " 7 ", "-12.25", "1e3", "nan", "", "bad", 4, 2.5]
+    expected = []
+    for v in values:
+        try:
+            expected.append(m.transform(v))
+        except ValueError:
+            expected.append(float("nan"))
+    result = m.transform_many(values)
+    assert len(result) == len(expected)
+    for r, e in zip(result, expected):
+        assert type(r) is float
+        assert r == e or (math.isnan(r) and math.isnan(e))
+
+
+def test_discrete_transform_many():
+    m = DiscreteMapping({"1": "f", "2": "m"})
+    assert m.transform_many(["1", "3", "2", "1"]) == ["f", "", "m", "f"]
+    m = PassthroughMapping({"1": "f", "2": "m"})
+    assert m.transform_many(["1", "3", "2", "1"]) == ["f", "3", "m", "f"]
+    assert Identity().transform_many(["1", "3"]) == ["1", "3"]
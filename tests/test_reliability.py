@@ -1,4 +1,7 @@
 import pytest
+import bz2
+import lzma
+import warnings
 
 from scorify import reliability
 import numpy as np
@@ -69,3 +72,214 @@ def test_mahalanobis():
 
 
 
+
+
+def test_mahalanobis_in_chunks():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(101, 4)))
+    whole = reliability.get_mahalanobis(df)
+    chunked = reliability.get_mahalanobis(df, chunk_rows=7)
+    assert np.allclose(whole, chunked)
+    # The same as the textbook formula, with the full inverse
+    y_mu = df.values - df.values.mean(axis=0)
+    inv_cov = np.linalg.inv(np.cov(df.values.T))
+    expected = np.sum(np.dot(y_mu, inv_cov) * y_mu, axis=1)
+    assert np.allclose(whole, expected)
+
+
+def test_mahalanobis_singular():
+    df = pd.DataFrame(data=[[1, 2], [2, 4], [3, 6]])
+    assert np.isnan(reliability.get_mahalanobis(df))
+
+
+def test_mahalanobis_p():
+    # The median of a chi-square distribution with 2 degrees of freedom
+    p = reliability.mahalanobis_p(np.array([2 * np.log(2), 0.0]), 2)
+    assert np.allclose(p, [0.5, 1.0])
+
+
+def test_measure_stats_if_deleted():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(rng.integers(1, 6, size=(40, 5)),
+                      columns=['a', 'b', 'c', 'd', 'e'])
+    stats = reliability.MeasureStats(df)
+    assert np.isclose(stats.mean, np.mean(df.values))
+    assert np.isclose(stats.stdev, np.std(df.values))
+    means, stdevs, alphas = stats.if_deleted()
+    item_total_r = stats.item_total_r()
+    for i, q in enumerate(df.columns):
+        rest = df.drop(q, axis=1)
+        assert np.isclose(means[i], np.mean(rest.values))
+        assert np.isclose(stdevs[i], np.std(rest.values))
+        assert np.isclose(alphas[i], reliability.get_alpha(rest))
+        assert np.isclose(item_total_r[i],
+                          np.corrcoef(df[q], rest.sum(axis=1))[0, 1])
+
+
+def test_measure_stats_two_items():
+    df = pd.DataFrame(data=[[1, 2], [2, 2], [3, 5]])
+    means, stdevs, alphas = reliability.MeasureStats(df).if_deleted()
+    assert np.allclose(alphas, [1.0, 1.0])
+
+
+def test_reliability_cli(capsys):
+    reliability.main_test(['examples/test_alpha_scoresheet.csv',
+                           'examples/test_alpha_data.csv'])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[2].split() == ['m', '4.2381', '2.5431', '0.7010']
+    assert lines[5].split()[:4] == ['omit', 'item3', '4.1429', '2.5873']
+    assert lines[-1].split()[:2] == ['g', 'm']
+
+
+@pytest.mark.parametrize('extension,compress', [('.xz', lzma), ('.bz2', bz2)])
+def test_reliability_cli_compressed(tmp_path, capsys, extension, compress):
+    data = tmp_path / ('data.csv' + extension)
+    with open('examples/test_alpha_data.csv', 'rb') as f:
+        data.write_bytes(compress.compress(f.read()))
+    reliability.main_test(['examples/test_alpha_scoresheet.csv', str(data)])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[2].split() == ['m', '4.2381', '2.5431', '0.7010']
+
+
+def test_reliability_cli_non_numeric(tmp_path, capsys, caplog):
+    data = tmp_path / 'data.csv'
+    data.write_text('id,item1,item2,item3\n'
+                    'a,2,1,1\nb,6,5,5\nc,8,x,9\nd,3,2,4\n,1,1,1\n'
+                    'e,2,3,\nf,0,9,6\ng,5,6,4\n')
+    with caplog.at_level('INFO'):
+        reliability.main_test(['examples/test_alpha_scoresheet.csv',
+                               str(data)])
+    assert 'item2: 0 blank and 1 non-numeric values' in caplog.text
+    assert 'item3: 1 blank and 0 non-numeric values' in caplog.text
+    participants = [line.split()[0] for line in
+                    capsys.readouterr().out.splitlines()[-6:]]
+    # list-wise deletion drops c and e
+    assert participants == ['participant', 'a', 'b', 'd', 'f', 'g']
+
+
+def test_bootstrap_sums():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame(rng.integers(1, 6, size=(30, 4)),
+                      columns=['a', 'b', 'c', 'd'])
+    bootstrap = reliability.Bootstrap(df, [('m', ['a', 'b', 'c']),
+                                           ('n', ['c', 'd'])])
+    counts = rng.multinomial(30, [1 / 30] * 30, size=3)
+    results = bootstrap.alphas(counts @ bootstrap.values)
+    for row, resample_counts in enumerate(counts):
+        resampled = df.loc[np.repeat(df.index, resample_counts)]
+        m = reliability.MeasureStats(resampled[['a', 'b', 'c']])
+        assert np.isclose(results['m'][0][row], m.alpha)
+        assert np.allclose(results['m'][1][row], m.if_deleted()[2])
+        assert np.isclose(results['n'][0][row],
+                          reliability.get_alpha(resampled[['c', 'd']]))
+
+
+def test_bootstrap_reproducible(monkeypatch):
+    monkeypatch.setattr(reliability, 'BOOTSTRAP_BLOCK', 7)
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.normal(size=(50, 3)), columns=['a', 'b', 'c'])
+    bootstrap = reliability.Bootstrap(df, [('m', ['a', 'b', 'c'])])
+    assert bootstrap.block_sizes(30) == [7, 7, 7, 7, 2]
+    one = bootstrap.resample(30, np.random.SeedSequence(5))
+    two = bootstrap.resample(30, np.random.SeedSequence(5), jobs=2)
+    assert one['m'][0].shape == (30,)
+    assert one['m'][1].shape == (30, 3)
+    assert np.array_equal(one['m'][0], two['m'][0])
+    assert np.array_equal(one['m'][1], two['m'][1])
+
+
+def test_reliability_cli_bootstrap(capsys):
+    reliability.main_test(['--bootstrap', '500', '--seed', '3',
+                           'examples/test_alpha_scoresheet.csv',
+                           'examples/test_alpha_data.csv'])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[-4:] == ['alpha', '2.5%', 'alpha', '97.5%']
+    low, high = [float(v) for v in lines[2].split()[-2:]]
+    assert low < 0.7010 < high
+    assert len(lines[3].split()) == 8
+
+
+def test_measure_stats_coefficients():
+    rng = np.random.default_rng(4)
+    factor = rng.normal(size=(200, 1))
+    df = pd.DataFrame(factor + rng.normal(size=(200, 5)),
+                      columns=['a', 'b', 'c', 'd', 'e'])
+    stats = reliability.MeasureStats(df)
+    values = df.values
+    corr = np.corrcoef(values.T)
+    assert np.isclose(stats.mean_r(), corr[np.triu_indices(5, 1)].mean())
+
+    # lambda 6, from regressing each item on the others
+    errors = 0
+    for i in range(5):
+        others = np.column_stack([np.ones(200), np.delete(values, i, axis=1)])
+        coefs = np.linalg.lstsq(others, values[:, i], rcond=None)[0]
+        errors += np.var(values[:, i] - others @ coefs, ddof=1)
+    total_variance = np.var(values.sum(axis=1), ddof=1)
+    assert np.isclose(stats.lambda6(), 1 - errors / total_variance)
+
+    cov = np.cov(values.T)
+    lambda1 = 1 - np.trace(cov) / total_variance
+    squares = np.sum(cov ** 2) - np.sum(np.diag(cov) ** 2)
+    assert np.isclose(stats.lambda2(),
+                      lambda1 + np.sqrt(5 / 4 * squares) / total_variance)
+    assert stats.lambda2() >= stats.alpha
+
+    r = np.corrcoef(values[:, ::2].sum(axis=1), values[:, 1::2].sum(axis=1))[0, 1]
+    assert np.isclose(stats.split_half(), 2 * r / (1 + r))
+
+
+def test_omega():
+    loadings = np.array([0.8, 0.7, 0.6, 0.5])
+    rng = np.random.default_rng(5)
+    n = 100000
+    values = (rng.normal(size=(n, 1)) * loadings +
+              rng.normal(size=(n, 4)) * np.sqrt(1 - loadings ** 2))
+    stats = reliability.MeasureStats(pd.DataFrame(values))
+    assert np.allclose(stats.loadings(), loadings, atol=0.02)
+    common = loadings.sum() ** 2
+    expected = common / (common + np.sum(1 - loadings ** 2))
+    assert abs(stats.omega() - expected) < 0.01
+
+
+def test_parse_metrics():
+    assert reliability.parse_metrics('Omega, mean-r') == ['omega', 'mean-r']
+    assert reliability.parse_metrics('all') == list(reliability.METRICS)
+    with pytest.raises(ValueError):
+        reliability.parse_metrics('alpha,beta')
+
+
+def test_reliability_cli_metrics(capsys):
+    reliability.main_test(['--metrics', 'alpha,lambda2',
+                           'examples/test_alpha_scoresheet.csv',
+                           'examples/test_alpha_data.csv'])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[7].split() == ['alpha', 'lambda2']
+    assert lines[8].split() == ['m', '0.7010', '0.7403']
+
+
+def test_mahalanobis_too_few_rows():
+    assert np.isnan(reliability.get_mahalanobis(pd.DataFrame(data=[[1, 2]])))
+    assert np.isnan(reliability.get_mahalanobis(
+        pd.DataFrame(data=np.empty((0, 2)))))
+
+
+
+def test_reliability_cli_bootstrap_too_few(tmp_path, capsys, caplog):
+    data = tmp_path / 'data.csv'
+    data.write_text('id,item1,item2,item3\na,2,1,1\nb,6,,5\n')
+    with caplog.at_level('INFO'):
+        reliability.main_test(['--bootstrap', '100',
+                               'examples/test_alpha_scoresheet.csv',
+                               str(data)])
+    assert "Can't bootstrap with 1 participants" in caplog.text
+    assert 'alpha 2.5%' not in capsys.readouterr().out
+
+
+def test_confidence_interval_all_nan():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        interval = reliability.confidence_interval(
+            np.array([[np.nan, 1.0], [np.nan, 2.0]]))
+    assert np.isnan(interval[:, 0]).all()
+    assert np.allclose(interval[:, 1], [1.025, 1.975])
@@ -3,6 +3,7 @@ import csv
 
 from .base import from_subdir
 from scorify.scripts import score_multi
+from pathlib import Path
 
 
 def test_help(capsys):
@@ -39,4 +40,223 @@ def test_success(pytestconfig, tmp_path):
     assert score_commands_count == len(list(tmp_path.glob("*.csv")))
 
 
-# More tests??
+def test_jobs_match_serial(pytestconfig, tmp_path):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    args = [
+        str(data_dir / "success.csv"),
+        str(data_dir / "score_{instrument}.csv"),
+        str(data_dir / "data_{event}.csv"),
+    ]
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "parallel").mkdir()
+    score_multi.main(args + [str(tmp_path / "serial" / "{instrument}_{event}.csv")])
+    score_multi.main(
+        ["--jobs=2"] + args + [str(tmp_path / "parallel" / "{instrument}_{event}.csv")]
+    )
+    serial = sorted((tmp_path / "serial").glob("*.csv"))
+    assert len(serial) == 3
+    for path in serial:
+        assert path.read_text() == (tmp_path / "parallel" / path.name).read_text()
+
+
+def test_failed_rows_dont_stop_others(pytestconfig, tmp_path, caplog):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    multi_file = tmp_path / "multi.csv"
+    multi_file.write_text("instrument,event\nmissing,t1\npanas,t1\nbfi,t2\n")
+    for jobs in [1, 2]:
+        with open(multi_file) as multi_csv:
+            results = score_multi.score_multi(
+                multi_csv,
+                str(data_dir / "score_{instrument}.csv"),
+                str(data_dir / "data_{event}.csv"),
+                str(tmp_path / "{instrument}_{event}.csv"),
+                "",
+                False,
+                True,
+                "NaN",
+                jobs=jobs,
+            )
+        assert [r.number for r in results] == [1, 2, 3]
+        assert [r.ok for r in results] == [False, True, True]
+        assert "Error scoring" in results[0].records[-1].getMessage()
+    assert len(list(tmp_path.glob("*_t*.csv"))) == 2
+    assert "Scored 2 of 3 rows (1 failed, 0 up to date)" in caplog.text
+
+
+def test_broken_scoresheet_only_fails_its_row(pytestconfig, tmp_path, caplog):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    for name in ["score_bfi.csv", "score_panas.csv"]:
+        (tmp_path / name).write_bytes((data_dir / name).read_bytes())
+    # Reads the datafile like the others, but names a column it doesn't have
+    broken = (data_dir / "score_bfi.csv").read_text() + "\nscore,no_such_column,,,\n"
+    (tmp_path / "score_broken.csv").write_text(broken)
+    multi_file = tmp_path / "multi.csv"
+    multi_file.write_text("instrument,event\nbroken,t1\npanas,t1\nbfi,t1\n")
+    for jobs in [1, 2]:
+        with open(multi_file) as multi_csv:
+            results = score_multi.score_multi(
+                multi_csv,
+                str(tmp_path / "score_{instrument}.csv"),
+                str(data_dir / "data_{event}.csv"),
+                str(tmp_path / "out_{instrument}_{event}.csv"),
+                "",
+                False,
+                True,
+                "NaN",
+                jobs=jobs,
+            )
+        assert [r.ok for r in results] == [False, True, True]
+        assert "Error scoring" in results[0].records[-1].getMessage()
+    assert sorted(p.name for p in tmp_path.glob("out_*.csv")) == [
+        "out_bfi_t1.csv",
+        "out_panas_t1.csv",
+    ]
+    assert "Scored 2 of 3 rows (1 failed, 0 up to date)" in caplog.text
+
+
+def test_scoresheet_cache(pytestconfig, tmp_path):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    sheet = tmp_path / "score.csv"
+    sheet.write_text((data_dir / "score_bfi.csv").read_text())
+    cache = score_multi.ScoresheetCache()
+    first = cache.get(sheet)
+    assert cache.get(tmp_path / "." / "score.csv") is first
+    # A changed file gets parsed again
+    sheet.write_text((data_dir / "score_panas.csv").read_text())
+    assert cache.get(sheet) is not first
+    assert len(cache) == 2
+
+
+def test_scoresheets_parsed_once(pytestconfig, tmp_path, monkeypatch):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    parsed = []
+    read_scoresheet = score_multi.score_data.read_scoresheet
+
+    def counting_read(scoresheet_file, dialect):
+        parsed.append(scoresheet_file.name)
+        return read_scoresheet(scoresheet_file, dialect)
+
+    monkeypatch.setattr(score_multi.score_data, "read_scoresheet", counting_read)
+    multi_file = tmp_path / "multi.csv"
+    multi_file.write_text("instrument,event\nbfi,t1\nbfi,t2\npanas,t1\nbfi,t1\n")
+    with open(multi_file) as multi_csv:
+        results = score_multi.score_multi(
+            multi_csv,
+            str(data_dir / "score_{instrument}.csv"),
+            str(data_dir / "data_{event}.csv"),
+            str(tmp_path / "{instrument}_{event}.csv"),
+            "",
+            True,
+            True,
+            "NaN",
+        )
+    assert all(r.ok for r in results)
+    assert len(parsed) == 2
+
+
+def test_datafiles_read_once(pytestconfig, tmp_path, monkeypatch):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    loaded = []
+    load_datafile = score_multi.score_data.load_datafile
+
+    def counting_load(scoresheets, data_file, *args):
+        loaded.append((data_file.name, len(scoresheets)))
+        return load_datafile(scoresheets, data_file, *args)
+
+    monkeypatch.setattr(score_multi.score_data, "load_datafile", counting_load)
+    with open(data_dir / "success.csv", encoding="utf-8-sig") as multi_csv:
+        results = score_multi.score_multi(
+            multi_csv,
+            str(data_dir / "score_{instrument}.csv"),
+            str(data_dir / "data_{event}.csv"),
+            str(tmp_path / "{instrument}_{event}.csv"),
+            "",
+            False,
+            True,
+            "NaN",
+        )
+    assert [r.ok for r in results] == [True, True, True]
+    assert sorted((Path(name).name, n) for name, n in loaded) == [
+        ("data_t1.csv", 2),
+        ("data_t2.csv", 1),
+    ]
+    # Scoring together gives the same output as scoring alone
+    alone = tmp_path / "alone"
+    alone.mkdir()
+    multi_file = tmp_path / "multi.csv"
+    multi_file.write_text("instrument,event\npanas,t1\n")
+    score_multi.main(
+        [
+            str(multi_file),
+            str(data_dir / "score_{instrument}.csv"),
+            str(data_dir / "data_{event}.csv"),
+            str(alone / "{instrument}_{event}.csv"),
+        ]
+    )
+    together = (tmp_path / "panas_t1.csv").read_text()
+    assert together == (alone / "panas_t1.csv").read_text()
+
+
+def test_incremental_skips_unchanged(pytestconfig, tmp_path, caplog):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    for name in ["score_bfi.csv", "score_panas.csv", "data_t1.csv", "data_t2.csv"]:
+        (tmp_path / name).write_bytes((data_dir / name).read_bytes())
+    args = [
+        "--incremental",
+        str(data_dir / "success.csv"),
+        str(tmp_path / "score_{instrument}.csv"),
+        str(tmp_path / "data_{event}.csv"),
+        str(tmp_path / "scored_{instrument}_{event}.csv"),
+    ]
+    score_multi.main(args)
+    assert len(list(tmp_path.glob("scored_*.csv.scorify.json"))) == 3
+    assert "Scored 3 of 3 rows (0 failed, 0 up to date)" in caplog.text
+
+    caplog.clear()
+    score_multi.main(args)
+    assert "Scored 0 of 3 rows (0 failed, 3 up to date)" in caplog.text
+
+    # Changing a datafile only rescores the rows that use it
+    caplog.clear()
+    with open(tmp_path / "data_t2.csv", "a") as f:
+        f.write("\n")
+    score_multi.main(args)
+    assert "Scored 1 of 3 rows (0 failed, 2 up to date)" in caplog.text
+
+    # And so does changing an option
+    caplog.clear()
+    score_multi.main(["--float-places=3"] + args)
+    assert "Scored 3 of 3 rows (0 failed, 0 up to date)" in caplog.text
+
+
+def test_incremental_hashes_each_file_once(pytestconfig, tmp_path, monkeypatch):
+    data_dir = pytestconfig.rootpath / "tests" / "multi"
+    hashed = []
+    file_digest = score_multi.file_digest
+
+    def counting_digest(filename):
+        hashed.append(Path(filename).name)
+        return file_digest(filename)
+
+    monkeypatch.setattr(score_multi, "file_digest", counting_digest)
+    multi_file = tmp_path / "multi.csv"
+    multi_file.write_text("instrument,event\nbfi,t1\npanas,t1\nbfi,t2\nbfi,t1\n")
+    with open(multi_file) as multi_csv:
+        results = score_multi.score_multi(
+            multi_csv,
+            str(data_dir / "score_{instrument}.csv"),
+            str(data_dir / "data_{event}.csv"),
+            str(tmp_path / "{instrument}_{event}.csv"),
+            "",
+            True,
+            True,
+            "NaN",
+            incremental=True,
+        )
+    assert all(r.ok for r in results)
+    assert sorted(hashed) == [
+        "data_t1.csv",
+        "data_t2.csv",
+        "score_bfi.csv",
+        "score_panas.csv",
+    ]
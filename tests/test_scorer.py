@@ -182,3 +182,122 @@ def test_measures_multi_names(scored_data_2, measures_2):
     scorer.Scorer.add_measures(scored_data_2, measures_2)
     d = scored_data_2.data[0]
     assert d["affect"] == 5 + 4 + 2 + 2
+
+
+def test_scorer_streams(data_1, transforms, scores_2, measures_with_ratio):
+    expected = scorer.Scorer.score(data_1, transforms, scores_2)
+    scorer.Scorer.add_measures(expected, measures_with_ratio)
+    data_1.data = iter(data_1.data)
+    data_1.streaming = True
+    res = scorer.Scorer.score(data_1, transforms, scores_2)
+    scorer.Scorer.add_measures(res, measures_with_ratio)
+    assert res.header == expected.header
+    assert list(res) == expected.data
+
+
+def test_plan_is_reusable(data_1, data_with_bad, transforms, scores_1):
+    plan = scorer.Scorer.compile(transforms, scores_1)
+    assert plan.header == ("happy1: happy", "happy2: happy: reverse")
+    res = scorer.Scorer.score_with_plan(data_1, plan)
+    assert res.data == scorer.Scorer.score(data_1, transforms, scores_1).data
+    res = scorer.Scorer.score_with_plan(data_with_bad, plan)
+    assert math.isnan(res.data[0]["happy2: happy: reverse"])
+
+
+def test_plan_fails_on_unknown_transform(transforms):
+    ss = scoresheet.ScoreSection()
+    ss.append_from_strings(["happy1", "happy", "bogus"])
+    with pytest.raises(scorer.TransformError):
+        scorer.Scorer.compile(transforms, ss)
+
+
+def test_scorer_checks_columns_before_scoring(transforms, scores_2):
+    df = datafile.Datafile(None, None, None)
+    df.header = ["ppt", "happy1", "happy2"]
+    with pytest.raises(scorer.ScoringError):
+        scorer.Scorer.score(df, transforms, scores_2)
+    res = scorer.Scorer.score(df, transforms, scores_2, ignore_missing=True)
+    assert res.data == []
+    df.append_data(["a", "5", "1"])
+    res = scorer.Scorer.score(df, transforms, scores_2, ignore_missing=True)
+    assert res.data[0]["sad1: sad"] == ""
+    assert res.data[0]["happy2: happy: reverse"] == 5
+
+
+def test_scorer_columnar_matches_rows(data_1, transforms, scores_2, gender_score):
+    df = datafile.ColumnarDatafile(None, None, None)
+    df.header = list(data_1.header)
+    for row in data_1:
+        df.append_data([row[h] for h in data_1.header])
+    for scores in [scores_2, gender_score]:
+        expected = scorer.Scorer.score(data_1, transforms, scores)
+        res = scorer.Scorer.score(df, transforms, scores)
+        assert res.header == expected.header
+        assert res.data == expected.data
+
+
+def test_streaming_measures_in_chunks(monkeypatch, transforms, scores_2, measures_2):
+    monkeypatch.setattr(scorer, "CHUNK_ROWS", 2)
+    df = datafile.Datafile(None, None, None)
+    df.header = ["ppt", "happy1", "sad1", "happy2", "sad2"]
+    for i in range(5):
+        df.append_data([str(i), str(i), "2", "bad" if i == 3 else "4", "1"])
+    expected = scorer.Scorer.score(df, transforms, scores_2)
+    scorer.Scorer.add_measures(expected, measures_2)
+    df.data = iter(df.data)
+    df.streaming = True
+    res = scorer.Scorer.score(df, transforms, scores_2)
+    scorer.Scorer.add_measures(res, measures_2)
+    rows = list(res)
+    assert len(rows) == 5
+    assert rows[:3] == expected.data[:3]
+    assert math.isnan(rows[3]["affect"])
+    assert rows[4] == expected.data[4]
+
+
+def test_measure_order_doesnt_matter(scored_data_2):
+    ms = scoresheet.AggregatorSection()
+    ms.append_from_strings(["ratio_happy", "ratio(sum_happy, sum_sad)"])
+    ms.append_from_strings(["sum_happy", "sum(happy)"])
+    ms.append_from_strings(["sum_sad", "sum(sad)"])
+    scorer.Scorer.add_measures(scored_data_2, ms)
+    assert scored_data_2.header[-3:] == ["ratio_happy", "sum_happy", "sum_sad"]
+    assert scored_data_2.data[0]["ratio_happy"] == 9.0 / 4.0
+
+
+def test_circular_measures_fail(scored_data_2):
+    ms = scoresheet.AggregatorSection()
+    ms.append_from_strings(["a", "sum(b, happy)"])
+    ms.append_from_strings(["b", "sum(a)"])
+    with pytest.raises(scorer.CircularMeasureError):
+        scorer.Scorer.add_measures(scored_data_2, ms)
+
+
+def test_score_parallel_matches(monkeypatch, transforms, scores_2, measures_with_ratio):
+    monkeypatch.setattr(scorer, "CHUNK_ROWS", 2)
+    df = datafile.Datafile(None, None, None)
+    df.header = ["ppt", "happy1", "sad1", "happy2", "sad2"]
+    for i in range(7):
+        df.append_data([str(i), str(i % 5), "2", "bad" if i == 3 else "4", "1"])
+    expected = scorer.Scorer.score(df, transforms, scores_2)
+    scorer.Scorer.add_measures(expected, measures_with_ratio)
+    plan = scorer.Scorer.compile(transforms, scores_2)
+    res = scorer.Scorer.score_parallel(df, plan, measures_with_ratio, 2)
+    assert res.header == expected.header
+    assert len(res.data) == 7
+    for r, e in zip(res.data, expected.data):
+        assert r.keys() == e.keys()
+        for k in r:
+            assert r[k] == e[k] or (math.isnan(r[k]) and math.isnan(e[k]))
+
+
+def test_scorer_tracks_numeric_columns(scored_data_2, measures_with_ratio):
+    assert scored_data_2.numeric_columns == set(
+        ["happy2: happy: reverse", "sad2: sad: reverse"]
+    )
+    ms = scoresheet.AggregatorSection()
+    ms.append_from_strings(["all_sad", "join(sad)"])
+    ms.append_from_strings(["sum_sad", "sum(sad)"])
+    scorer.Scorer.add_measures(scored_data_2, ms)
+    assert "sum_sad" in scored_data_2.numeric_columns
+    assert "all_sad" not in scored_data_2.numeric_columns
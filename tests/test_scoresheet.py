@@ -116,6 +116,14 @@ def test_rename_section_with_string_list():
     assert s.map_name("baz") == "baz"
 
 
+def test_rename_section_original_names():
+    s = scoresheet.RenameSection()
+    s.append_from_strings(["foo", "bar"])
+    assert s.original_names(["bar", "baz"]) == set(["foo", "bar", "baz"])
+    # foo would become bar, so it's not a name we want
+    assert s.original_names(["foo"]) == set()
+
+
 def test_rename_section_dupes():
     s = scoresheet.RenameSection()
     s.append_from_strings(["foo", "bar"])
@@ -169,3 +177,10 @@ def test_aggregator_section_dupes():
     with pytest.raises(scoresheet.SectionError):
         s.append_directive(d)
     assert len(s.directives) == 1
+
+
+def test_referenced_columns(good_sample_csv):
+    sheet = scoresheet.Reader(good_sample_csv).read_into_scoresheet()
+    assert sheet.referenced_columns() == set(
+        ["ppt", "happy1", "sad1", "happy2", "sad2", "gender"]
+    )
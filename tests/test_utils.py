@@ -2,7 +2,9 @@
 # Part of the scorify package
 # Copyright (c) 2024 Board of Regents of the University of Wisconsin System
 
-from scorify import utils
+import numpy as np
+
+from scorify import datafile, utils
 
 
 def test_float_pp():
@@ -15,3 +17,55 @@ def test_pp():
     assert utils.pp(1.0) == "1"
     assert utils.pp(None, none_val="NaN") == "NaN"
     assert utils.pp(True) == "True"
+
+
+def test_factorize_and_take():
+    codes, levels = utils.factorize(["b", "a", "b", "c"])
+    assert levels == ["b", "a", "c"]
+    assert list(codes) == [0, 1, 0, 2]
+    assert utils.take(levels, codes) == ["b", "a", "b", "c"]
+
+
+def test_factorize_uses_columns():
+    col = datafile.Column(["x", "y", "x"])
+    codes, levels = utils.factorize(col)
+    assert levels is col.levels
+    assert list(codes) == [0, 1, 0]
+
+
+def test_to_float_array():
+    floats, invalid = utils.to_float_array(["1", "", "2.5", "nan", None, "1"])
+    assert list(invalid) == [False, True, False, False, True, False]
+    assert floats[0] == 1.0 and floats[2] == 2.5 and floats[5] == 1.0
+    assert np.isnan(floats[1]) and np.isnan(floats[3]) and np.isnan(floats[4])
+
+
+def test_coercion_counts():
+    columns = [["1", "", "x"], datafile.Column(["2", " ", "3"])]
+    values, invalid = utils.to_float_matrix(columns)
+    assert values.shape == (3, 2)
+    assert values[0, 1] == 2.0 and values[2, 1] == 3.0
+    assert utils.coercion_counts(columns, invalid) == [(1, 1), (1, 0)]
+
+
+def test_make_pp_matches_pp():
+    values = [1.0, 2.675, 0.125, -0.001, 1e20, float("nan"), float("inf"), 1.2e-5]
+    values += [None, True, "foo", 3, -12.3456789, 123456789.987654321]
+    for places in [0, 2, 6]:
+        fast_pp = utils.make_pp(places, none_val="NA")
+        for v in values:
+            assert fast_pp(v) == utils.pp(v, float_places=places, none_val="NA")
+
+
+def test_open_by_extension_round_trips(tmp_path):
+    for name in ["plain.csv", "packed.csv.gz", "packed.csv.bz2", "packed.csv.XZ"]:
+        fname = tmp_path / name
+        with utils.open_by_extension(fname, "w") as f:
+            f.write("a,b\nü,2\n")
+        with utils.open_by_extension(fname) as f:
+            assert f.name == str(fname)
+            assert f.read() == "a,b\nü,2\n"
+    assert utils.compressed_opener(tmp_path / "plain.csv") is None
+    with open(tmp_path / "packed.csv.gz", "rb") as f:
+        # The gzip magic number
+        assert f.read(2) == b"\x1f\x8b"